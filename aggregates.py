@@ -0,0 +1,556 @@
+"""Aggregates precomputed once per process from the nominative vote table.
+
+The vote table has one row per deputy per scrutin. Scanning it on every
+rerun of a page is what made the vote related widgets slow, so it is turned
+once into a dense deputy x scrutin matrix, from which the per-deputy and
+per-party totals, the positions, cohesion and agreement of the parties, and
+the closest deputies of each deputy, and their participation over time, are
+derived. Pages then only do row lookups.
+Every aggregate covers all the votes of one legislature.
+The vote table itself is not kept: the matrix is the only copy of the
+nominative votes in memory, shared by all the pages and made read-only.
+The deputies are also counted once in a party x sex x age x activity cube,
+from which the demographic charts are sums over slices, and the scrutins of
+each year in a calendar of cumulative counts per day, from which the vote
+heatmap is a difference of two slices.
+"""
+import numpy as np
+import pandas as pd
+
+from data_store import (get_data_deputies, get_data_political_parties, get_data_version, get_data_vote_requesters,
+                        get_data_votes, get_data_votes_partition, read_vote_total)
+from resource_cache import cache_resource
+
+# values of the vote matrix
+ABSENT = 0
+POUR = 1
+CONTRE = 2
+ABSTENTION = 3
+
+VOTE_COLUMNS = ['pour', 'contre', 'abstentions', 'par delegation', 'vote']
+
+
+class VoteMatrix:
+    """Dense deputy x scrutin matrix of the positions taken by each deputy.
+    Attributes
+    ----------
+    deputies:
+        index of the deputy codes, one per row of the matrix.
+    scrutins:
+        index of the scrutin codes, one per column of the matrix.
+    votes:
+        int8 array of shape (deputies, scrutins) holding ABSENT, POUR, CONTRE or ABSTENTION.
+    delegation:
+        bool array of the same shape, True when the vote was cast by delegation.
+    """
+    def __init__(self, df_vote_total):
+        deputy_code = df_vote_total['deputy code'].astype('category').cat
+        scrutin = df_vote_total['scrutin'].astype('category').cat
+        self.deputies = pd.Index(deputy_code.categories, name='deputy code')
+        self.scrutins = pd.Index(scrutin.categories, name='scrutin')
+
+        rows = deputy_code.codes.to_numpy()
+        columns = scrutin.codes.to_numpy()
+        position = np.full(len(df_vote_total), ABSENT, dtype=np.int8)
+        position[df_vote_total['pour'].to_numpy(dtype=bool)] = POUR
+        position[df_vote_total['contre'].to_numpy(dtype=bool)] = CONTRE
+        position[df_vote_total['abstentions'].to_numpy(dtype=bool)] = ABSTENTION
+
+        self.votes = np.zeros((len(self.deputies), len(self.scrutins)), dtype=np.int8)
+        self.votes[rows, columns] = position
+        self.delegation = np.zeros(self.votes.shape, dtype=bool)
+        self.delegation[rows, columns] = df_vote_total['par delegation'].to_numpy(dtype=bool)
+        # the matrix is shared by all the sessions
+        self.votes.setflags(write=False)
+        self.delegation.setflags(write=False)
+
+    @property
+    def nbytes(self):
+        return (self.votes.nbytes + self.delegation.nbytes +
+                self.deputies.memory_usage(deep=True) + self.scrutins.memory_usage(deep=True))
+
+    def totals(self):
+        """Number of pour, contre, abstentions, votes by delegation and votes of each deputy."""
+        return pd.DataFrame({
+            'pour': (self.votes == POUR).sum(axis=1),
+            'contre': (self.votes == CONTRE).sum(axis=1),
+            'abstentions': (self.votes == ABSTENTION).sum(axis=1),
+            'par delegation': self.delegation.sum(axis=1),
+            'vote': (self.votes != ABSENT).sum(axis=1)
+        }, index=self.deputies)
+
+
+@cache_resource('compute', version=get_data_version)
+def get_vote_matrix(legislature):
+    return VoteMatrix(read_vote_total(legislature))
+
+
+@cache_resource('compute', version=get_data_version)
+def get_deputy_vote_totals(legislature):
+    """Vote counts of every deputy of the vote table, indexed by deputy code."""
+    return get_vote_matrix(legislature).totals()
+
+
+@cache_resource('compute', version=get_data_version)
+def get_party_vote_totals(legislature):
+    """Vote counts summed over the current members of each party.
+    'members' is the number of deputies of the party, whether they voted or not.
+    """
+    df_dep = get_data_deputies(legislature)
+    df = get_deputy_vote_totals(legislature).reindex(df_dep['code'], fill_value=0)
+    df['pol party'] = df_dep['pol party'].to_numpy()
+    df['members'] = 1
+    return df.groupby('pol party', observed=True).sum()
+
+
+@cache_resource('compute', version=get_data_version)
+def get_party_vote_ratios(legislature):
+    """Average presence and position of each party at the votes.
+    The vote counts of the party are divided by its number of members times the number of scrutins,
+    'vote' is then the average share of the party deputies voting on a scrutin.
+    The table is sorted by decreasing presence.
+    """
+    df_polpar = get_data_political_parties(legislature).rename(columns={"abreviated_name": "pol party"})
+    df = pd.merge(get_party_vote_totals(legislature).drop(columns=['members']), df_polpar.drop(columns=['code', 'name']),
+                  left_index=True, right_on='pol party')
+    nb_votes = len(get_vote_matrix(legislature).scrutins)
+    for column in VOTE_COLUMNS:
+        df[column] = df[column]/(df['members']*nb_votes)
+    return df.sort_values(by=['vote'], ascending=False).reset_index(drop=True)
+
+
+def get_deputy_presence(legislature, codes):
+    """Vote counts of the deputies of codes (0 for a deputy who never voted) and their 'presence', the share of the
+    scrutins they voted on.
+    """
+    df = get_deputy_vote_totals(legislature).reindex(codes, fill_value=0)
+    nb_votes = len(get_vote_matrix(legislature).scrutins)
+    df['presence'] = df['vote']/nb_votes if nb_votes else np.nan
+    return df
+
+
+def get_vote_requests(legislature, years, codes):
+    """Number of the scrutins of codes requested by each party ('demand'), in total and per member of the party
+    ('demand per deputy'), with the name and color of the party. The requesters which are not a party (government,
+    commissions...) and the parties which requested no scrutin are left out.
+    """
+    df_requesters = get_data_vote_requesters(legislature, years)
+    demand = df_requesters.loc[df_requesters['code'].isin(codes), 'requester'].value_counts()
+    df_polpar = get_data_political_parties(legislature).drop(columns=['code']).set_index('abreviated_name')
+    df = df_polpar.merge(demand.rename('demand'), left_index=True, right_index=True)
+    df['demand per deputy'] = df['demand']/df['members']
+    return df
+
+
+###
+# Demographics
+# The counts of deputies per party, sex, age and activity. Any combination of the filters of the home page is a slice
+# of the cube, and every chart a sum of the slice over the other axes.
+
+CUBE_AXES = ['pol party', 'sex', 'age', 'activity']
+
+
+class DemographicCube:
+    """Number of deputies per party, sex, age and activity.
+    Attributes
+    ----------
+    labels:
+        dict of the values of each axis of CUBE_AXES ('age' holds every age between the youngest and oldest deputy).
+    counts:
+        int32 array of shape (parties, sexes, ages, activities).
+    """
+    def __init__(self, df_dep):
+        party = df_dep['pol party'].astype('category').cat
+        sex = df_dep['sex'].astype('category').cat
+        activity = df_dep['activity'].astype('category').cat
+        age = df_dep['age'].to_numpy()
+        self.labels = {
+            'pol party': pd.Index(party.categories.astype(str), name='pol party'),
+            'sex': pd.Index(sex.categories.astype(str), name='sex'),
+            'age': pd.RangeIndex(age.min(), age.max() + 1, name='age'),
+            'activity': pd.Index(activity.categories.astype(str), name='activity')
+        }
+        self.counts = np.zeros([len(self.labels[axis]) for axis in CUBE_AXES], dtype=np.int32)
+        np.add.at(self.counts, (party.codes, sex.codes, age - age.min(), activity.codes), 1)
+        self.counts.setflags(write=False)
+
+    def members(self):
+        """Number of deputies of each party."""
+        return pd.Series(self.counts.sum(axis=(1, 2, 3)), index=self.labels['pol party'])
+
+    def sum(self, by, parties=None, sexes=None, age_range=None):
+        """Number of deputies of the selected parties, sexes and age range (None selects everything).
+        Parameters
+        ----------
+        by:
+            axis, or list of two axes, of the counts. A series is returned for one axis, a dataframe for two.
+        """
+        masks = [np.ones(len(self.labels[axis]), dtype=bool) for axis in CUBE_AXES]
+        if parties is not None:
+            masks[0] = self.labels['pol party'].isin(parties)
+        if sexes is not None:
+            masks[1] = self.labels['sex'].isin(sexes)
+        if age_range is not None:
+            masks[2] = (self.labels['age'] >= age_range[0]) & (self.labels['age'] <= age_range[1])
+        counts = self.counts[np.ix_(*masks)]
+
+        axes = [by] if isinstance(by, str) else list(by)
+        kept = [CUBE_AXES.index(axis) for axis in axes]
+        counts = counts.sum(axis=tuple(i for i in range(len(CUBE_AXES)) if i not in kept))
+        labels = [self.labels[CUBE_AXES[i]][masks[i]] for i in kept]
+        if len(axes) == 1:
+            return pd.Series(counts, index=labels[0])
+        if kept[0] > kept[1]:
+            counts = counts.T
+        return pd.DataFrame(counts, index=labels[0], columns=labels[1])
+
+
+@cache_resource('compute', version=get_data_version)
+def get_demographic_cube(legislature):
+    return DemographicCube(get_data_deputies(legislature))
+
+
+###
+# Calendar
+# The number of scrutins and the presence of the deputies on each day of a year. The scrutins are sorted by number of
+# voters and the counts accumulated along that order, so the days of the scrutins with a number of voters in a range
+# are the difference of two slices of the calendar.
+
+CALENDAR_METRICS = ['count', 'presence']
+
+
+class VoteCalendar:
+    """Cumulative counts of the scrutins of one year per day, by increasing number of voters.
+    Attributes
+    ----------
+    voters:
+        sorted distinct values of 'nb votants' of the scrutins of the year.
+    count, presence:
+        int32 arrays of shape (len(voters) + 1, 12, 31), the slice i holds per month and day the number of scrutins,
+        or the sum of their percentages of deputy presence, of the scrutins with less voters than voters[i].
+    """
+    def __init__(self, df_votes, nb_deputies):
+        voters = df_votes['nb votants'].to_numpy()
+        self.voters, ranks = np.unique(voters, return_inverse=True)
+        # the deputies are the ones in office at the end of the legislature, a few more may have voted on a scrutin
+        percentage = np.minimum(((voters/nb_deputies)*100).astype(int), 100)
+        cells = (ranks, df_votes['month'].to_numpy(dtype=int) - 1, df_votes['day'].to_numpy(dtype=int) - 1)
+        for metric, values in [('count', 1), ('presence', percentage)]:
+            calendar = np.zeros((len(self.voters) + 1, 12, 31), dtype=np.int32)
+            np.add.at(calendar[1:], cells, values)
+            calendar = np.cumsum(calendar, axis=0, dtype=np.int32)
+            calendar.setflags(write=False)
+            setattr(self, metric, calendar)
+
+    @property
+    def nbytes(self):
+        return self.voters.nbytes + self.count.nbytes + self.presence.nbytes
+
+    def grid(self, metric, nb_voters=None):
+        """Month x day dataframe of the scrutins whose number of voters is in the range nb_voters (all by default).
+        metric 'count' gives the number of scrutins of each day, 'presence' their average percentage of deputy
+        presence, truncated to an integer.
+        """
+        start, end = 0, len(self.voters)
+        if nb_voters is not None:
+            start = np.searchsorted(self.voters, nb_voters[0], side='left')
+            end = np.searchsorted(self.voters, nb_voters[1], side='right')
+        count = self.count[end] - self.count[start]
+        if metric == 'count':
+            values = count
+        elif metric == 'presence':
+            values = np.zeros(count.shape)
+            np.divide(self.presence[end] - self.presence[start], count, out=values, where=count > 0)
+        else:
+            raise ValueError('metric must be one of {}'.format(CALENDAR_METRICS))
+        return pd.DataFrame(values.astype(int), index=pd.RangeIndex(1, 13, name='month'),
+                            columns=pd.RangeIndex(1, 32, name='day'))
+
+
+@cache_resource('compute', version=get_data_version)
+def get_vote_calendar(legislature, year):
+    return VoteCalendar(get_data_votes_partition(legislature, year), len(get_data_deputies(legislature)))
+
+
+###
+# Cohesion
+# The position of each party on each scrutin, from the votes of its current members. The number of members of each
+# party taking a position is the product of a party x deputy membership matrix with the deputy x scrutin indicator
+# of the position, so every aggregate below is a few matrix products over the vote matrix.
+
+POSITIONS = [POUR, CONTRE, ABSTENTION]
+
+
+class PartyPositions:
+    """Positions taken by the parties on every scrutin.
+    Attributes
+    ----------
+    parties:
+        index of the parties, one per row of the arrays.
+    scrutins:
+        index of the scrutin codes, one per column of the arrays.
+    counts:
+        int32 array of shape (3, parties, scrutins), number of members voting pour, contre and abstention.
+    majority:
+        int8 array of shape (parties, scrutins), the position taken by the most members (POUR, CONTRE or ABSTENTION,
+        ties going to the first of them), ABSENT when no member voted.
+    rice:
+        float array of shape (parties, scrutins), Rice index |pour - contre| / (pour + contre) of the party, NaN when
+        no member voted pour or contre.
+    """
+    def __init__(self, matrix, df_dep):
+        party = df_dep['pol party'].astype('category').cat
+        self.parties = pd.Index(party.categories.astype(str), name='pol party')
+        self.scrutins = matrix.scrutins
+
+        # deputies which left the assembly have no party, their votes are not counted
+        rows = matrix.deputies.get_indexer(df_dep['code'])
+        known = rows >= 0
+        membership = np.zeros((len(self.parties), len(matrix.deputies)), dtype=np.float32)
+        membership[party.codes.to_numpy()[known], rows[known]] = 1
+        # a count is at most the number of members of the party, far below 2**24, exact in float32
+        self.counts = np.stack([membership @ (matrix.votes == position).astype(np.float32)
+                                for position in POSITIONS]).astype(np.int32)
+
+        self.majority = np.array(POSITIONS, dtype=np.int8)[self.counts.argmax(axis=0)]
+        self.majority[self.counts.sum(axis=0) == 0] = ABSENT
+        pour, contre = self.counts[0], self.counts[1]
+        self.rice = np.full(pour.shape, np.nan)
+        np.divide(np.abs(pour - contre), pour + contre, out=self.rice, where=(pour + contre) > 0)
+        for array in [self.counts, self.majority, self.rice]:
+            array.setflags(write=False)
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes + self.majority.nbytes + self.rice.nbytes
+
+    def cohesion(self):
+        """Average Rice index of each party over the scrutins where its members voted pour or contre."""
+        return pd.Series(np.nanmean(self.rice, axis=1), index=self.parties, name='cohesion')
+
+    def agreement(self):
+        """Party x party share of the scrutins on which both parties took the same majority position, among the
+        scrutins where both took one (NaN when there is none).
+        """
+        # counts over all the scrutins, summed in float64 so that they and their ratios are exact
+        taken = [(self.majority == position).astype(np.float64) for position in POSITIONS]
+        same = sum(position @ position.T for position in taken)
+        present = sum(taken)
+        both = present @ present.T
+        rates = np.full(both.shape, np.nan)
+        np.divide(same, both, out=rates, where=both > 0)
+        return pd.DataFrame(rates, index=self.parties, columns=self.parties)
+
+
+@cache_resource('compute', version=get_data_version)
+def get_party_positions(legislature):
+    return PartyPositions(get_vote_matrix(legislature), get_data_deputies(legislature))
+
+
+@cache_resource('compute', version=get_data_version)
+def get_party_cohesion(legislature):
+    return get_party_positions(legislature).cohesion()
+
+
+@cache_resource('compute', version=get_data_version)
+def get_party_agreement(legislature):
+    return get_party_positions(legislature).agreement()
+
+
+###
+# Similarity
+# How often two deputies take the same position on the scrutins they both voted on. The numbers of shared scrutins
+# and of scrutins with the same position are products of the deputy x scrutin indicators of each position, computed
+# once for the whole assembly, then only the closest deputies of each deputy are kept.
+
+TOP_K = 20
+MIN_SHARED = 30
+# number of scrutins whose indicators are multiplied at once, the float32 products of a chunk are exact counts
+SCRUTIN_CHUNK = 8192
+
+
+class DeputyNeighbours:
+    """Closest deputies of each deputy by voting record, and a map of the assembly.
+    Attributes
+    ----------
+    deputies:
+        index of the deputy codes, one per row of the arrays.
+    neighbours:
+        int array of shape (deputies, k), rows of the deputies taking most often the same position as each deputy,
+        the closest first (-1 when less deputies share at least min_shared scrutins with the deputy).
+    agreement:
+        float array of shape (deputies, k), share of the shared scrutins on which the positions are the same.
+    shared:
+        int array of shape (deputies, k), number of scrutins on which both deputies voted.
+    embedding:
+        float array of shape (deputies, 2), first two principal components of the positions (pour 1, contre -1,
+        abstention or absent 0), deputies voting alike are close to each other.
+    """
+    def __init__(self, matrix, codes, k=TOP_K, min_shared=MIN_SHARED):
+        rows = matrix.deputies.get_indexer(codes)
+        rows = rows[rows >= 0]
+        self.deputies = matrix.deputies[rows]
+        votes = matrix.votes[rows]
+
+        # the counts of each chunk of scrutins are summed in float64, they stay exact whatever the number of scrutins
+        same = np.zeros((len(rows), len(rows)))
+        shared = np.zeros((len(rows), len(rows)))
+        gram = np.zeros((len(rows), len(rows)))
+        for start in range(0, votes.shape[1], SCRUTIN_CHUNK):
+            chunk = votes[:, start:start + SCRUTIN_CHUNK]
+            taken = [(chunk == position).astype(np.float32) for position in POSITIONS]
+            same += sum(position @ position.T for position in taken)
+            present = sum(taken)
+            shared += present @ present.T
+            # positions centered per scrutin
+            positions = taken[0] - taken[1]
+            positions = positions - positions.mean(axis=0)
+            gram += positions @ positions.T
+        # the pairs sharing too few scrutins, and each deputy paired with itself, are ranked last
+        agreement = np.full(shared.shape, -1.0)
+        np.divide(same, shared, out=agreement, where=shared >= max(min_shared, 1))
+        np.fill_diagonal(agreement, -1.0)
+
+        k = min(k, len(rows) - 1)
+        self.neighbours = np.argsort(-agreement, axis=1, kind='stable')[:, :k]
+        self.agreement = np.take_along_axis(agreement, self.neighbours, axis=1)
+        self.shared = np.take_along_axis(shared, self.neighbours, axis=1).astype(np.int32)
+        self.neighbours[self.agreement < 0] = -1
+        self.agreement[self.agreement < 0] = np.nan
+
+        values, vectors = np.linalg.eigh(gram)
+        self.embedding = vectors[:, [-1, -2]] * np.sqrt(np.maximum(values[[-1, -2]], 0))
+        # the sign of the components is arbitrary, it is fixed so that the map does not flip between two builds
+        self.embedding = self.embedding * np.sign(self.embedding[np.abs(self.embedding).argmax(axis=0), [0, 1]])
+        for array in [self.neighbours, self.agreement, self.shared, self.embedding]:
+            array.setflags(write=False)
+
+    @property
+    def nbytes(self):
+        return (self.neighbours.nbytes + self.agreement.nbytes + self.shared.nbytes + self.embedding.nbytes +
+                self.deputies.memory_usage(deep=True))
+
+    def closest(self, code, k=10):
+        """Codes of the k deputies voting most like the deputy, with their agreement and number of shared scrutins.
+        The table is empty for a deputy who never voted.
+        """
+        row = self.deputies.get_indexer([code])[0]
+        if row < 0:
+            return pd.DataFrame({'code': [], 'agreement': [], 'shared': []})
+        neighbours = self.neighbours[row, :k]
+        known = neighbours >= 0
+        return pd.DataFrame({'code': self.deputies[neighbours[known]], 'agreement': self.agreement[row, :k][known],
+                             'shared': self.shared[row, :k][known]})
+
+
+@cache_resource('compute', version=get_data_version)
+def get_deputy_neighbours(legislature):
+    """Closest deputies of the current deputies."""
+    return DeputyNeighbours(get_vote_matrix(legislature), get_data_deputies(legislature)['code'])
+
+
+@cache_resource('compute', version=get_data_version)
+def get_deputy_map(legislature):
+    """Position of each current deputy who voted on the map of the assembly, with the party of the deputy."""
+    neighbours = get_deputy_neighbours(legislature)
+    df_dep = get_data_deputies(legislature).set_index('code')
+    return pd.DataFrame({'x': neighbours.embedding[:, 0], 'y': neighbours.embedding[:, 1],
+                         'pol party': df_dep.loc[neighbours.deputies, 'pol party'].astype(str).to_numpy()},
+                        index=neighbours.deputies)
+
+
+###
+# Participation over time
+# The number of votes of each deputy and party accumulated day after day. The scrutins are sorted by date and the
+# vote matrix summed along that order once, then the votes of any period, a month or a rolling window, are the
+# difference of two rows of the cumulative arrays.
+
+ROLLING_WINDOWS = [30, 90]
+
+
+class ParticipationSeries:
+    """Cumulative number of scrutins and of votes of each deputy and party, one row per day.
+    Attributes
+    ----------
+    days:
+        every day from the first to the last scrutin.
+    deputies, parties:
+        index of the deputy codes and of the parties, one per column of the vote arrays.
+    members:
+        number of current members of each party.
+    scrutins:
+        int32 array of shape (days + 1,), number of scrutins up to the end of each day (the first row is 0).
+    deputy_votes, party_votes:
+        int32 arrays of shape (days + 1, deputies) and (days + 1, parties), number of votes up to the end of each
+        day of each deputy and of the current members of each party.
+    """
+    def __init__(self, matrix, df_votes, df_dep):
+        dates = df_votes.set_index('code')['datetime'].reindex(matrix.scrutins).to_numpy()
+        known = ~pd.isna(dates)
+        order = np.argsort(dates[known], kind='stable')
+        dates = dates[known][order]
+        self.days = pd.date_range(dates[0], dates[-1], freq='D', name='day') if len(dates) else \
+            pd.DatetimeIndex([], name='day')
+        # position in the scrutins sorted by date of the end of each day
+        ends = np.searchsorted(dates, self.days.to_numpy(), side='right')
+
+        present = (matrix.votes[:, np.flatnonzero(known)[order]] != ABSENT)
+        cumulative = np.zeros((len(dates) + 1, len(matrix.deputies)), dtype=np.int32)
+        np.cumsum(present.T, axis=0, dtype=np.int32, out=cumulative[1:])
+        self.scrutins = np.concatenate([[0], ends]).astype(np.int32)
+
+        # the columns of the current deputies only, in the order of the deputies dataset
+        party = df_dep['pol party'].astype('category').cat
+        rows = matrix.deputies.get_indexer(df_dep['code'])
+        self.deputies = pd.Index(df_dep['code'], name='deputy code')
+        self.deputy_votes = np.zeros((len(self.days) + 1, len(self.deputies)), dtype=np.int32)
+        self.deputy_votes[1:, rows >= 0] = cumulative[ends][:, rows[rows >= 0]]
+
+        self.parties = pd.Index(party.categories.astype(str), name='pol party')
+        self.members = np.bincount(party.codes, minlength=len(self.parties))
+        membership = np.zeros((len(self.deputies), len(self.parties)), dtype=np.int32)
+        membership[np.arange(len(self.deputies)), party.codes] = 1
+        self.party_votes = self.deputy_votes @ membership
+        for array in [self.scrutins, self.deputy_votes, self.party_votes, self.members]:
+            array.setflags(write=False)
+
+    @property
+    def nbytes(self):
+        return (self.scrutins.nbytes + self.deputy_votes.nbytes + self.party_votes.nbytes + self.members.nbytes +
+                self.deputies.memory_usage(deep=True) + self.parties.memory_usage(deep=True))
+
+    def _votes(self, deputy=None, party=None):
+        # cumulative votes of one deputy or party, and the number of deputies they count
+        if deputy is not None:
+            return self.deputy_votes[:, self.deputies.get_loc(deputy)], 1
+        position = self.parties.get_loc(party)
+        return self.party_votes[:, position], self.members[position]
+
+    def monthly(self, deputy=None, party=None):
+        """Number of scrutins, of votes and participation rate of a deputy or a party per month."""
+        votes, deputies = self._votes(deputy, party)
+        months = self.days.to_period('M')
+        # rows of the cumulative arrays at the end of each month
+        ends = np.flatnonzero(np.append(months[1:] != months[:-1], True)) + 1
+        starts = np.concatenate([[0], ends[:-1]])
+        df = pd.DataFrame({'scrutins': self.scrutins[ends] - self.scrutins[starts],
+                           'votes': votes[ends] - votes[starts]}, index=months[ends - 1].rename('month'))
+        df['rate'] = df['votes']/(df['scrutins']*deputies)
+        return df
+
+    def rolling(self, window, deputy=None, party=None):
+        """Participation rate of a deputy or a party over the window days up to each day, NaN when there was no
+        scrutin during the window.
+        """
+        votes, deputies = self._votes(deputy, party)
+        ends = np.arange(1, len(self.days) + 1)
+        starts = np.maximum(ends - window, 0)
+        scrutins = (self.scrutins[ends] - self.scrutins[starts])*deputies
+        rates = np.full(len(ends), np.nan)
+        np.divide(votes[ends] - votes[starts], scrutins, out=rates, where=scrutins > 0)
+        return pd.Series(rates, index=self.days, name='rolling {} days'.format(window))
+
+
+@cache_resource('compute', version=get_data_version)
+def get_participation_series(legislature):
+    return ParticipationSeries(get_vote_matrix(legislature), get_data_votes(legislature), get_data_deputies(legislature))
@@ -0,0 +1,394 @@
+"""JSON API over the aggregates displayed by the pages.
+
+Serves the numbers of the comparator, votes and deputies pages without
+rendering them: the handlers call the same cached loaders of data_store and
+aggregates of aggregates.py and indexes.py, shared by all the requests of the
+process, and only convert their rows to json.
+    GET /legislatures                       legislatures with their vote years
+    GET /parties?party=LAREM&party=FI       presence, vote split and cohesion of the parties (all by default)
+    GET /parties/agreement                  party x party share of the scrutins with the same majority position
+    GET /deputies?code=PA1&code=PA2         vote counts, presence and closest deputies of each deputy
+    GET /deputies/participation?code=PA1    number of scrutins, of votes and participation rate per month of each
+                                            deputy (code=) or party (party=)
+    GET /votes?year=2019&year=2020          number of scrutins, accepted ones and requests per party of the years
+    GET /votes/calendar?year=2019           month x day grid of the number of scrutins (metric=count) or average
+                                            presence (metric=presence)
+    GET /votes/search?q=amendement          scrutins matching the words of their title or requester
+Every query takes the legislature (legislature=15, the most recent one by
+default). The parameters taking several values (code, party, year) are
+repeated or comma separated, so a batch of deputies is one request:
+/deputies?codes=PA1,PA2,PA3.
+
+Each answer is cached (RESPONSE_CACHE_BYTES at most, least recently used
+answers evicted first) until the ETL rewrites the data, and carries an ETag, a
+request whose If-None-Match holds it is answered 304 Not Modified without a
+body.
+
+Usage:
+    python api.py --port 8502
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (CALENDAR_METRICS, TOP_K, get_deputy_neighbours, get_deputy_presence,
+                        get_participation_series, get_party_agreement, get_party_cohesion, get_party_vote_ratios,
+                        get_vote_calendar, get_vote_matrix, get_vote_requests)
+from data_store import (get_data_deputies, get_data_version, get_data_votes, get_legislature_info, get_legislatures,
+                        get_vote_years)
+from indexes import get_scrutin_index
+from metrics import add_gauges, count, span, write_metrics
+
+RESPONSE_CACHE_BYTES = 16 * 1024 * 1024
+# default number of closest deputies and of search results, at most TOP_K closest deputies are kept by the aggregate
+CLOSEST = 10
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+
+logger = logging.getLogger('api')
+
+
+class ApiError(Exception):
+    """Error answered to the client with its HTTP status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+###
+# Parameters
+
+
+def get_values(params, name):
+    """Values of a parameter given several times (code=A&code=B) or comma separated (codes=A,B)."""
+    values = params.get(name, []) + params.get(name + 's', [])
+    return [value for text in values for value in text.split(',') if value]
+
+
+def get_value(params, name, default=None):
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def get_int(params, name, default=None, minimum=None, maximum=None):
+    value = get_value(params, name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, '{} must be an integer'.format(name))
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ApiError(400, '{} must be between {} and {}'.format(name, minimum, maximum))
+    return value
+
+
+def get_legislature(params):
+    legislatures = get_legislatures()
+    legislature = get_value(params, 'legislature', legislatures[-1])
+    if legislature not in legislatures:
+        raise ApiError(404, 'unknown legislature {}'.format(legislature))
+    return legislature
+
+
+def get_years(params, legislature):
+    vote_years = get_vote_years(legislature)
+    years = get_values(params, 'year') or vote_years
+    unknown = [year for year in years if year not in vote_years]
+    if unknown:
+        raise ApiError(404, 'no vote in {}'.format(', '.join(unknown)))
+    return years
+
+
+def to_json(value):
+    """Value made of python types only, NaN becomes null."""
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray, pd.Index)):
+        return [to_json(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (pd.Timestamp, pd.Period)):
+        return str(value)
+    return value
+
+
+###
+# Handlers, each one returns the json body of its path
+
+
+def get_legislatures_json(params):
+    return {'legislatures': [dict(get_legislature_info(legislature), years=get_vote_years(legislature))
+                             for legislature in get_legislatures()]}
+
+
+def get_parties_json(params):
+    legislature = get_legislature(params)
+    df = get_party_vote_ratios(legislature)
+    parties = get_values(params, 'party')
+    if parties:
+        df = df[df['pol party'].isin(parties)]
+    cohesion = get_party_cohesion(legislature)
+    return {'legislature': legislature, 'scrutins': len(get_vote_matrix(legislature).scrutins),
+            'unknown': [party for party in parties if party not in set(df['pol party'])],
+            'parties': [{'party': row['pol party'], 'members': row['members'], 'color': row['color'],
+                         'presence': row['vote'], 'pour': row['pour'], 'contre': row['contre'],
+                         'abstentions': row['abstentions'], 'par delegation': row['par delegation'],
+                         'cohesion': cohesion.get(row['pol party'], float('nan'))}
+                        for _, row in df.iterrows()]}
+
+
+def get_party_agreement_json(params):
+    legislature = get_legislature(params)
+    df = get_party_agreement(legislature)
+    return {'legislature': legislature, 'parties': df.index, 'agreement': df.to_numpy()}
+
+
+def get_deputies_json(params):
+    """Vote counts, presence (share of the scrutins the deputy voted on) and closest deputies of each code."""
+    legislature = get_legislature(params)
+    codes = get_values(params, 'code')
+    if not codes:
+        raise ApiError(400, 'no deputy code given')
+    closest = get_int(params, 'closest', CLOSEST, 0, TOP_K)
+    df_dep = get_data_deputies(legislature).set_index('code')
+    known = [code for code in codes if code in df_dep.index]
+    df_votes = get_deputy_presence(legislature, known)
+    neighbours = get_deputy_neighbours(legislature)
+    return {'legislature': legislature, 'scrutins': len(get_vote_matrix(legislature).scrutins),
+            'deputies': [{'code': code, 'name': df_dep.at[code, 'full_name'], 'party': df_dep.at[code, 'pol party'],
+                          'votes': row.drop('presence').astype(int).to_dict(), 'presence': row['presence'],
+                          'closest': neighbours.closest(code, closest).to_dict(orient='records')}
+                         for code, row in df_votes.iterrows()],
+            'unknown': [code for code in codes if code not in df_dep.index]}
+
+
+def get_participation_json(params):
+    legislature = get_legislature(params)
+    participation = get_participation_series(legislature)
+    codes = get_values(params, 'code')
+    parties = get_values(params, 'party')
+    if not codes and not parties:
+        raise ApiError(400, 'no deputy code nor party given')
+
+    def months(df):
+        return df.reset_index().assign(month=lambda df: df['month'].astype(str)).to_dict(orient='records')
+    return {'legislature': legislature,
+            'deputies': [{'code': code, 'months': months(participation.monthly(deputy=code))}
+                         for code in codes if code in participation.deputies],
+            'parties': [{'party': party, 'months': months(participation.monthly(party=party))}
+                        for party in parties if party in participation.parties],
+            'unknown': [code for code in codes if code not in participation.deputies] +
+                       [party for party in parties if party not in participation.parties]}
+
+
+def get_votes_json(params):
+    """Scrutins of the years with their number of voters in the range min_voters, max_voters, and the number of
+    requests of each party, as in the votes page (the requests of the government and commissions are not counted).
+    """
+    legislature = get_legislature(params)
+    years = get_years(params, legislature)
+    df_votes = get_data_votes(legislature, years)
+    nb_voters = (get_int(params, 'min_voters', 0), get_int(params, 'max_voters', np.iinfo(np.int32).max))
+    df_votes = df_votes[df_votes['nb votants'].between(*nb_voters)]
+    df_requests = get_vote_requests(legislature, years, df_votes['code']).sort_values(by='demand', ascending=False)
+    return {'legislature': legislature, 'years': years, 'scrutins': len(df_votes.index),
+            'accepted': int((df_votes['accepted'] == 'yes').sum()),
+            'first vote': df_votes['datetime'].min().strftime('%Y-%m-%d') if len(df_votes.index) else None,
+            'last vote': df_votes['datetime'].max().strftime('%Y-%m-%d') if len(df_votes.index) else None,
+            'requests': [{'party': party, 'requests': row['demand'], 'per deputy': row['demand per deputy']}
+                         for party, row in df_requests.iterrows()]}
+
+
+def get_calendar_json(params):
+    legislature = get_legislature(params)
+    years = get_years(params, legislature)
+    metric = get_value(params, 'metric', 'count')
+    if metric not in CALENDAR_METRICS:
+        raise ApiError(400, 'metric must be one of {}'.format(', '.join(CALENDAR_METRICS)))
+    nb_voters = (get_int(params, 'min_voters', 0), get_int(params, 'max_voters', np.iinfo(np.int32).max))
+    return {'legislature': legislature, 'metric': metric,
+            'years': [{'year': year, 'grid': get_vote_calendar(legislature, year).grid(metric, nb_voters).to_numpy()}
+                      for year in years]}
+
+
+def get_search_json(params):
+    legislature = get_legislature(params)
+    query = get_value(params, 'q', '')
+    years = get_years(params, legislature)
+    limit = get_int(params, 'limit', SEARCH_LIMIT, 0, MAX_SEARCH_LIMIT)
+    scrutin_index = get_scrutin_index(legislature)
+    positions, scores = scrutin_index.search(query, limit=len(scrutin_index.codes))
+    df_found = pd.DataFrame({'code': scrutin_index.codes[positions], 'score': scores}).merge(
+        get_data_votes(legislature, years), on='code').head(limit)
+    return {'legislature': legislature, 'query': query,
+            'scrutins': [{'code': row['code'], 'date': row['datetime'].strftime('%Y-%m-%d'), 'title': row['titre'],
+                          'requester': row['demandeur'], 'pour': row['pour'], 'contre': row['contre'],
+                          'abstentions': row['abstentions'], 'accepted': row['accepted'] == 'yes',
+                          'score': row['score']}
+                         for _, row in df_found.iterrows()]}
+
+
+ROUTES = {
+    '/legislatures': get_legislatures_json,
+    '/parties': get_parties_json,
+    '/parties/agreement': get_party_agreement_json,
+    '/deputies': get_deputies_json,
+    '/deputies/participation': get_participation_json,
+    '/votes': get_votes_json,
+    '/votes/calendar': get_calendar_json,
+    '/votes/search': get_search_json
+}
+
+
+###
+# Responses
+# The answers are cached by path and parameters (sorted by name, the order of the values is kept since it is the
+# order of the answer), along with the version of the data they were computed from: once the ETL rewrites the data
+# the cached answers and their ETags are stale, the next request computes the answer again. The ETag is a hash of the
+# body.
+
+
+class ResponseCache:
+    """Bodies of the answers, at most max_bytes of them, the least recently used ones are evicted first.
+    Attributes
+    ----------
+    bodies:
+        (version, body) of each key, in order of use (the most recent last).
+    """
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bodies = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        """Body of the key computed from the version of the data, None when it is not in the cache."""
+        with self._lock:
+            entry = self.bodies.get(key)
+            if entry is None or entry[0] != version:
+                self.misses = self.misses + 1
+                return None
+            self.bodies.move_to_end(key)
+            self.hits = self.hits + 1
+            return entry[1]
+
+    def put(self, key, version, body):
+        with self._lock:
+            if key in self.bodies:
+                self.size = self.size - len(self.bodies.pop(key)[1])
+            if len(body) > self.max_bytes:
+                return
+            self.bodies[key] = (version, body)
+            self.size = self.size + len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.bodies.popitem(last=False)
+                self.size = self.size - len(evicted)
+                self.evictions = self.evictions + 1
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self.bodies), 'bytes': self.size, 'max bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+_response_cache = ResponseCache()
+
+
+def get_response_cache():
+    return _response_cache
+
+
+add_gauges('response_cache', lambda: get_response_cache().stats())
+
+
+def get_data_versions():
+    # an answer may depend on any legislature (/legislatures lists them all), the versions of all of them are kept
+    return tuple((legislature, get_data_version(legislature)) for legislature in get_legislatures())
+
+
+def make_etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def get_response(path, params):
+    """Body of the answer to a query and its ETag, computed only when the cache does not hold it."""
+    if path not in ROUTES:
+        raise ApiError(404, 'unknown path {}'.format(path))
+    key = path + '?' + urlencode(sorted(params.items()), doseq=True)
+    version = get_data_versions()
+    body = _response_cache.get(key, version)
+    count('api_requests', name=path, result='hit' if body is not None else 'miss')
+    if body is None:
+        with span('api', path):
+            body = json.dumps(to_json(ROUTES[path](params)), ensure_ascii=False, allow_nan=False).encode('utf-8')
+        _response_cache.put(key, version, body)
+    return body, make_etag(body)
+
+
+def matches_etag(header, etag):
+    """True when the If-None-Match header holds the ETag (weak or not) or is *."""
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in [tag[2:] if tag.startswith('W/') else tag for tag in tags]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/') or '/'
+        try:
+            body, etag = get_response(path, parse_qs(url.query))
+            if matches_etag(self.headers.get('If-None-Match'), etag):
+                count('api_requests', name=path, result='not modified')
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+            else:
+                self.send_json(200, body, etag)
+        except ApiError as error:
+            self.send_json(error.status, json.dumps({'error': str(error)}).encode('utf-8'))
+        except Exception:
+            # a missing file or a failing aggregate, the client gets an answer instead of a closed connection
+            logger.exception('error answering %s', self.path)
+            count('api_requests', name=path, result='error')
+            self.send_json(500, json.dumps({'error': 'internal error'}).encode('utf-8'))
+        finally:
+            write_metrics()
+
+    def send_json(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(port, host=''):
+    return ThreadingHTTPServer((host, port), ApiHandler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='JSON API over the aggregates of the pages.')
+    parser.add_argument('--host', default='')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+    make_server(args.port, args.host).serve_forever()
@@ -1,17 +1,23 @@
 import streamlit as st
 from multiapp import MultiApp
-from apps import home, parties_comparator, vote_summary, deputies # import your app modules here
+from data_store import get_legislatures, get_selected_legislature, load_datasets, to_roman
 
 #configuration of the page
 st.set_page_config(layout="wide")
 
-app = MultiApp()
+# the datasets declared by a page are loaded for the selected legislature
+app = MultiApp(lambda datasets: load_datasets(datasets, get_selected_legislature()))
 
-# Add all your application here
-app.add_app("Home", home.app)
-app.add_app("Comparator", parties_comparator.app)
-app.add_app("Votes", vote_summary.app)
-app.add_app("Deputies", deputies.app)
+# Add all your application here, the modules are imported when the page is first selected
+app.add_app("Home", "apps.home")
+app.add_app("Comparator", "apps.parties_comparator")
+app.add_app("Votes", "apps.vote_summary")
+app.add_app("Deputies", "apps.deputies")
+
+# Legislature displayed by all the pages, they read it with data_store.get_selected_legislature
+legislatures = get_legislatures()
+st.sidebar.selectbox('Legislature', legislatures, index=len(legislatures) - 1, key='legislature',
+                     format_func=lambda legislature: to_roman(legislature) + 'th legislature')
 
 # The main app
 app.run()
\ No newline at end of file
@@ -1,105 +1,98 @@
 import streamlit as st
 import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
-import os
-from matplotlib.backends.backend_agg import RendererAgg
-from datetime import date
-from PIL import Image
-
-# Loading the data
-
-
-@st.cache_data
-def get_data_votes():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_vote_descr.csv'))
-    df['year'] = df['date'].astype(str).str[0:4]
-    df['month'] = df['date'].astype(str).str[5:7]
-    df['day'] = df['date'].astype(str).str[8:10]
-    df['datetime'] = pd.to_datetime(df[['year', 'month', 'day']], errors='coerce')
-    df['percentage of votes in favor'] = 100*df['pour']/df['nb votants']
-    df['accepted'] = 'no'
-    df.loc[df['pour'] >= df['requis'], 'accepted'] = 'yes'
-    df = df.drop(columns=['date'])
-    df.columns = df.columns.str.replace('demandeur ', '')
-    return df
-
-
-@st.cache_data
-def get_data_deputies():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_dep.csv'))
-    # create the value age from the date of birth of the deputies
-    df['age'] = df['date of birth'].astype(str).str[0:4]
-    df['age'] = date.today().year - df['age'].astype(int)
-    df['departement'] = df['dep'].astype(str) + ' (' + df['num_dep'] + ')'
-    df['full_name'] = df['first name'].astype(str) + ' ' + df['family name']
-    df['title'] = 'Mr.'
-    df.loc[df['sex'] == 'female', 'title'] = 'Mme.'
-    return df
-
-
-@st.cache_data
-def get_data_political_parties():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_polpar.csv'))
-    df = df.drop(columns=['code'])
-    return df
-
-
-@st.cache_data
-def get_data_organs():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_organs.csv'))
-    return df
-
-
-@st.cache_data
-def get_data_deputies_in_organs():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_deputies_in_organs.csv'))
-    return df
-
-
-@st.cache_data
-def get_data_vote_total():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_vote_total.csv'),
-                     dtype={
-        'pour': float,
-        'contre': float,
-        'abstentions': float,
-        'par delegation': float
-    })
-    df['vote'] = 1
-    df['deputy code'] = df['deputy code'].astype("category")
-    df['scrutin'] = df['scrutin'].astype("category")
-    return df
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
+import seaborn as sns
+from data_store import (get_data_deputies, get_data_political_parties, get_data_organs,
+                        get_data_deputies_in_organs, get_selected_legislature, get_portrait)
+from aggregates import (get_vote_matrix, get_deputy_presence, get_deputy_vote_totals, get_party_vote_totals,
+                        get_deputy_neighbours, get_deputy_map, get_participation_series)
+import client_charts
+from figure_cache import st_figure
+from indexes import get_deputy_index
+
+# datasets loaded by the app before the page runs
+DATASETS = ['deputies', 'political parties', 'organs', 'deputies in organs']
+
+###
+# Charts of the deputy, only drawn when the figure cache does not hold them already
+# (or drawn by the browser with the vega-lite backend)
+
+
+def draw_vote_percentage_donut(vote_percentage):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    ax.pie([100-vote_percentage, vote_percentage, 100],
+           wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=['lightgrey', 'blue', 'white'])
+    ax.annotate(str(vote_percentage)+'%', xy=(0, 0.1), fontsize=22, ha='center')
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+    return fig
+
+
+def spec_vote_percentage_donut(vote_percentage):
+    return client_charts.donut(['absent', 'voted', 'blank'], [100-vote_percentage, vote_percentage, 100],
+                               ['lightgrey', 'blue', 'white'], str(vote_percentage)+'%', legend=False)
+
+
+def draw_participation(df_participation):
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+    for column in df_participation.columns:
+        ax.plot(df_participation.index, df_participation[column]*100, label=column)
+    ax.set_ylabel('Percentage of the votes')
+    ax.set_ylim(0, 100)
+    ax.legend(loc='upper left')
+    fig.tight_layout()
+    return fig
+
+
+def spec_participation(df_participation):
+    return client_charts.lines(df_participation*100, 'Percentage of the votes')
+
+
+def draw_deputy_map(df_map, colors, highlight):
+    # every deputy at its position on the map of the assembly, the selected one circled
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.scatterplot(data=df_map, x='x', y='y', hue='pol party', palette=colors, alpha=0.7, ax=ax)
+    if highlight is not None:
+        ax.scatter(df_map['x'].iloc[highlight], df_map['y'].iloc[highlight], s=300, facecolors='none',
+                   edgecolors='black', linewidths=2)
+    ax.set(xlabel=None, ylabel=None, xticklabels=[], yticklabels=[])
+    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+    fig.tight_layout()
+    return fig
+
+
+def spec_deputy_map(df_map, colors, highlight):
+    return client_charts.scatter(df_map['x'], df_map['y'], df_map['pol party'], colors, highlight)
 
 
 def app():
     # configuration of the page
     # st.set_page_config(layout="wide")
-    matplotlib.use("agg")
-    _lock = RendererAgg.lock
 
     SPACER = .2
     ROW = 1
 
     # Load dataframes
-    df_dep = get_data_deputies()
-    df_votes = get_data_votes()
-    df_polpar = get_data_political_parties()
-    df_vote_total = get_data_vote_total().copy()
-    df_organs = get_data_organs()
-    df_deputies_in_organs = get_data_deputies_in_organs()
+    legislature = get_selected_legislature()
+    df_dep = get_data_deputies(legislature)
+    df_polpar = get_data_political_parties(legislature)
+    df_organs = get_data_organs(legislature)
+    df_deputies_in_organs = get_data_deputies_in_organs(legislature)
 
-    departement_list = ['']
-    for i in range(len(df_dep.sort_values(by=['num_dep'])['departement'].unique())):
-        departement_list.append(df_dep.sort_values(by=['num_dep'])['departement'].unique()[i])
+    # the filters and the name search are answered by indexes built once per legislature
+    deputy_index = get_deputy_index(legislature)
+    departement_list = [''] + deputy_index.departements
 
     # Sidebar
     # selection box for the different features
     st.sidebar.header('Select what to display')
     departement_selected = st.sidebar.selectbox('Select departement', departement_list)
     if (departement_selected == ''):
-        departement_selected = df_dep.sort_values(by=['num_dep'])['departement'].unique()
+        departement_selected = None
     else:
         departement_selected = [departement_selected]
     sex_selected = st.sidebar.selectbox('Select sex', ['both', 'female', 'male'])
@@ -108,18 +101,20 @@ def app():
         sex_selected = ['female', 'male']
     pol_party_selected = st.sidebar.multiselect('Select political parties', df_polpar['abreviated_name'].unique(
     ).tolist(), df_polpar['abreviated_name'].unique().tolist())
+    name_searched = st.sidebar.text_input('Search a deputy by name')
 
-    # creates masks from the sidebar selection widgets
-    mask_departement = df_dep['departement'].isin(departement_selected)
-    mask_sex = df_dep['sex'].isin(sex_selected)
-    mask_pol_parties = df_dep['pol party'].isin(pol_party_selected)
-
-    # Apply the mask
-    display_df = df_dep[mask_departement & mask_sex & mask_pol_parties]
+    # display ranks of the deputies corresponding to the selection
+    selected_ranks = deputy_index.select(departement_selected, pol_party_selected, sex_selected)
+    if name_searched:
+        found_ranks = deputy_index.search(name_searched)
+        selected_ranks = found_ranks[np.isin(found_ranks, selected_ranks)]
+    if len(selected_ranks) == 0:
+        st.warning('No deputy corresponds to the selection')
+        return
 
     # Make a selection box with pre-selected deputies
     deputy_selected = st.sidebar.selectbox('List of deputies corresponding',
-                                           display_df.sort_values(by=['sex', 'full_name'])['full_name'].unique())
+                                           pd.unique(deputy_index.names[selected_ranks]))
     deputy = df_dep[df_dep['full_name'].isin([deputy_selected])].reset_index()
 
     # get all the organs the deputy selected is belonging to
@@ -140,14 +135,17 @@ def app():
 
     with row1_1:
         st.write(deputy['title'][0] + ' ' + deputy['full_name'][0])
-        st.write('Born on the ', deputy['date of birth'][0])
+        st.write('Born on the ', deputy['date of birth'][0].strftime('%Y-%m-%d'))
         st.write('Former activity : ', deputy['activity'][0])
         st.write('Deputy of ' + deputy['pol party'][0] + ', elected in the circumscription number ' +
                  str(deputy['circo'][0]) + ' in the region of ' + deputy['dep'][0])
         st.write('Part of the ' + df_org.loc[df_org['type'] == 'COMPER']['name'].to_list()[0])
 
     with row1_2:
-        st.image(np.array(Image.open(os.path.join(os.getcwd(), 'data', 'pictures', deputy['code'][0] + '.jpg'))))
+        # the encoded portrait is sent as is, it is not decoded on the server
+        portrait = get_portrait(deputy['code'][0])
+        if portrait is not None:
+            st.image(portrait)
 
     study_groups_list = df_org.loc[df_org['type'] == 'GE']['name'].to_list()
     text = ''
@@ -161,34 +159,25 @@ def app():
         st.write('Also part of the study groups on : ' + text[0:-2])
 
     # calculate presence to vote
-    # get the average presence to the votes and average position of each party
-
-    nb_votes = len(df_vote_total['scrutin'].unique())
-    nb_deputies = len(df_vote_total['deputy code'].unique())
-    for column in ['pour', 'contre', 'abstentions', 'par delegation']:
-        df_vote_total[column] = df_vote_total[column].astype(float)
+    # the vote counts of each deputy and party are precomputed once from the deputy x scrutin vote matrix,
+    # here they are only looked up
+    df_deputy_votes = get_deputy_vote_totals(legislature)
+    nb_votes = len(get_vote_matrix(legislature).scrutins)
+    nb_deputies = len(df_deputy_votes.index)
 
-    selected_deputy_vote_information = df_vote_total.loc[df_vote_total['deputy code'] == deputy['code'][0]]
-    selected_deputy_vote_information = selected_deputy_vote_information.agg(
-        {'pour': 'sum', 'contre': 'sum', 'abstentions': 'sum', 'par delegation': 'sum', 'vote': 'sum'})
+    selected_deputy_vote_information = get_deputy_presence(legislature, [deputy['code'][0]]).iloc[0].astype(float)
     for column in ['pour', 'contre', 'abstentions', 'par delegation']:
         selected_deputy_vote_information[column] = (
             selected_deputy_vote_information[column]/selected_deputy_vote_information['vote'])
-    selected_deputy_vote_information['vote percentage'] = selected_deputy_vote_information['vote']/nb_votes
 
-    all_deputy_vote_information = df_vote_total
-    all_deputy_vote_information = all_deputy_vote_information.agg(
-        {'pour': 'sum', 'contre': 'sum', 'abstentions': 'sum', 'par delegation': 'sum', 'vote': 'sum'})
+    all_deputy_vote_information = df_deputy_votes.sum()
     all_deputy_vote_information['vote percentage'] = all_deputy_vote_information['vote']/(nb_votes*nb_deputies)
 
-    deputies_party_vote_information = df_vote_total
-    deputy_list = df_dep.loc[df_dep['pol party'] == deputy['pol party'][0]]['code'].to_list()
-    deputies_party_vote_information = deputies_party_vote_information[deputies_party_vote_information['deputy code'].isin(
-        deputy_list)]
-    deputies_party_vote_information = deputies_party_vote_information.agg(
-        {'pour': 'sum', 'contre': 'sum', 'abstentions': 'sum', 'par delegation': 'sum', 'vote': 'sum'})
+    deputies_party_vote_information = get_party_vote_totals(legislature).loc[deputy['pol party'][0]].astype(float)
     deputies_party_vote_information['vote percentage'] = deputies_party_vote_information['vote'] / \
-        (nb_votes*len(deputy_list))
+        (nb_votes*deputies_party_vote_information['members'])
+
+    deputies_vote_count = df_deputy_votes['vote'].sort_values(ascending=False)
 
     row3_spacer1, row3_1, row3_spacer2 = st.columns((SPACER/2, ROW, SPACER/2))
     with row3_1:
@@ -196,14 +185,10 @@ def app():
 
     # Participation to votes
     row4_spacer1, row4_1, row4_spacer2, row4_2, row4_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
-    with row4_1, _lock:
-        vote_percentage = round(selected_deputy_vote_information['vote percentage']*100, 2)
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie([100-vote_percentage, vote_percentage, 100],
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=['lightgrey', 'blue', 'white'])
-        label = ax.annotate(str(vote_percentage)+'%', xy=(0, 0.1), fontsize=22, ha='center')
-        plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+    with row4_1:
+        vote_percentage = round(selected_deputy_vote_information['presence']*100, 2)
+        st_figure('deputies/vote percentage', (vote_percentage,), draw_vote_percentage_donut,
+                  spec_vote_percentage_donut)
 
     with row4_2:
         vote_percentage = round(all_deputy_vote_information['vote percentage']*100, 2)
@@ -213,9 +198,48 @@ def app():
         vote_percentage = round(deputies_party_vote_information['vote percentage']*100, 2)
         st.write('Deputies from the same party : ' + str(vote_percentage) + '%')
         st.write('Deputies with the highest vote percentage : ' +
-                 str(round(100*df_vote_total['deputy code'].value_counts()[0]/nb_votes, 2)) + '%')
+                 str(round(100*deputies_vote_count.iloc[0]/nb_votes, 2)) + '%')
         st.write('Deputies with the lowest vote percentage : ' +
-                 str(round(100*df_vote_total['deputy code'].value_counts()[-5]/nb_votes, 2)) + '%')
+                 str(round(100*deputies_vote_count.iloc[-5]/nb_votes, 2)) + '%')
+
+    # Participation over time
+    # the votes of every deputy and party are accumulated day after day once, the rolling rates are differences of
+    # two rows of the cumulative arrays
+    participation = get_participation_series(legislature)
+    df_participation = pd.DataFrame({
+        'Deputy (30 days)': participation.rolling(30, deputy=deputy['code'][0]),
+        'Deputy (90 days)': participation.rolling(90, deputy=deputy['code'][0]),
+        deputy['pol party'][0] + ' (90 days)': participation.rolling(90, party=deputy['pol party'][0])
+    })
+
+    row5_spacer1, row5_1, row5_spacer2 = st.columns((SPACER/2, ROW, SPACER/2))
+    with row5_1:
+        st.header('Participation over time')
+        st_figure('deputies/participation', (df_participation,), draw_participation, spec_participation)
+
+    # Closest deputies by voting record
+    # the closest deputies of every deputy and the map of the assembly are computed once from the vote matrix,
+    # here they are only looked up
+    df_closest = get_deputy_neighbours(legislature).closest(deputy['code'][0], 10)
+    df_closest = df_closest.merge(df_dep[['code', 'full_name', 'pol party']], on='code')
+    df_closest = pd.DataFrame({'Deputy': df_closest['full_name'], 'Political party': df_closest['pol party'],
+                               'Same position': (100*df_closest['agreement']).round(1).map(str) + '%',
+                               'Votes in common': df_closest['shared']})
+    df_map = get_deputy_map(legislature)
+    highlight = df_map.index.get_indexer([deputy['code'][0]])[0]
+    colors = df_polpar.set_index('abreviated_name')['color'].to_dict()
+
+    row6_spacer1, row6_1, row6_spacer2 = st.columns((SPACER/2, ROW, SPACER/2))
+    with row6_1:
+        st.header('Deputies voting most like ' + deputy['full_name'][0])
+        if df_closest.empty:
+            st.write('This deputy did not vote')
+        else:
+            st.table(df_closest.set_index('Deputy'))
+        st.header('Map of the assembly')
+        st.write('Deputies voting alike are close to each other')
+        st_figure('deputies/map', (df_map, colors, highlight if highlight >= 0 else None), draw_deputy_map,
+                  spec_deputy_map)
 
     # vote
     # row3_spacer1, row3_1, row3_spacer2, row3_2, row3_spacer3 = st.columns((SPACER,ROW,SPACER,ROW, SPACER))
@@ -1,48 +1,115 @@
 import streamlit as st
 import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
 import seaborn as sns
-import os
-from matplotlib.backends.backend_agg import RendererAgg
-from datetime import date
+from aggregates import get_demographic_cube
+from data_store import (get_data_deputies, get_data_political_parties, get_selected_legislature,
+                        get_legislature_info, to_roman)
+import client_charts
+from figure_cache import st_figure
+
+# datasets loaded by the app before the page runs
+DATASETS = ['deputies', 'political parties']
 
 # Home page of the website
 # Displays general information about political parties at the national assembly
 
-# Loading the data
+###
+# Charts of the page, they are only drawn when the figure cache does not hold them already
+
+
+def draw_counts_donut(counts, colors):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    ax.pie(counts, labels=(counts.index + ' (' + counts.map(str) + ')'),
+           wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=colors)
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+    return fig
+
+
+def spec_counts_donut(counts, colors):
+    return client_charts.donut(counts.index + ' (' + counts.map(str) + ')', counts, colors)
+
+
+def draw_age_histogram(df_age):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    sns.histplot(data=df_age, x="age", weights="count", bins=12, stat="probability", ax=ax)
+    return fig
+
+
+def spec_age_histogram(df_age):
+    return client_charts.histogram(df_age['age'], 12, 'probability', weights=df_age['count'], xlabel='age')
+
+
+def draw_women_barplot(df_sex, colors):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    sns.barplot(x="sex_female", y="pol party", data=df_sex, ax=ax, palette=colors)
+    ax.set_ylabel('Political party')
+    ax.set_xlabel('Percentage of women deputies')
 
+    i = 0
+    text = (df_sex['sex_female'].round(2)*100).astype(int).to_list()
+    for rect in ax.patches:
+        height = rect.get_height()
+        ax.text(rect.get_x() + rect.get_width() / 2., rect.get_y() + height * 3 / 4.,
+                str(text[i])+'%', ha='center', va='bottom', rotation=0, color='white', fontsize=12)
+        i = i + 1
+    return fig
 
-@st.cache_data
-def get_data_deputies():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_dep.csv'))
-    # create the value age from the date of birth of the deputies
-    df['age'] = df['date of birth'].astype(str).str[0:4]
-    df['age'] = date.today().year - df['age'].astype(int)
-    df = df.drop(columns=['family name', 'first name', 'date of birth'])
-    return df
 
+def spec_women_barplot(df_sex, colors):
+    text = (df_sex['sex_female'].round(2)*100).astype(int).map(str) + '%'
+    return client_charts.barplot(df_sex['pol party'], df_sex['sex_female'], colors, 'Percentage of women deputies',
+                                 'Political party', text)
 
-@st.cache_data
-def get_data_political_parties():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_polpar.csv'))
-    df = df.drop(columns=['code'])
-    df.rename(columns={"abreviated_name": "pol party"})
-    return df
+
+###
+# Counts of the charts, all taken from the demographic cube so that a rerun only sums a few slices of it
+
+
+def _sorted_counts(counts, name):
+    # same order as value_counts, the most represented first
+    counts = counts.sort_values(ascending=False)
+    return counts[counts > 0].rename(name)
+
+
+def get_home_counts(cube, pol_party_selected, sex_selected, age_selected, nb_members_selected):
+    """Counts displayed by the page for a selection of the sidebar.
+    Returns a dict with the number of selected deputies per party ('party'), per age ('age') and per activity
+    ('activity'), and the number of deputies of each sex per selected party ('sex', regardless of sex and age).
+    """
+    # parties selected whose number of members is in the selected range
+    members = cube.members()
+    parties = members.index[members.index.isin(pol_party_selected) &
+                            members.between(nb_members_selected[0], nb_members_selected[1])]
+
+    party_counts = cube.sum('pol party', parties, sex_selected, age_selected)
+    party_counts = party_counts.reindex(cube.labels['pol party'], fill_value=0)
+    age_counts = cube.sum('age', parties, sex_selected, age_selected)
+    age_counts = age_counts[age_counts > 0].rename('count').reset_index()
+    df_sex = cube.sum(['pol party', 'sex'], parties).reindex(columns=['female', 'male'], fill_value=0)
+    df_sex = df_sex[df_sex.sum(axis=1) > 0].add_prefix('sex_')
+    activity_counts = cube.sum('activity', parties, sex_selected, age_selected)
+    return {'party': _sorted_counts(party_counts, 'pol party'), 'age': age_counts, 'sex': df_sex,
+            'activity': _sorted_counts(activity_counts, 'activity')}
 
 
 def app():
     # configuration of the page
     # st.set_page_config(layout="wide")
-    matplotlib.use("agg")
-    _lock = RendererAgg.lock
 
     SPACER = .2
     ROW = 1
 
     # load dataframes
-    df_deputies = get_data_deputies()
-    df_pol_parties = get_data_political_parties()
+    legislature = get_selected_legislature()
+    legislature_info = get_legislature_info(legislature)
+    df_deputies = get_data_deputies(legislature)
+    df_pol_parties = get_data_political_parties(legislature)
+    cube = get_demographic_cube(legislature)
 
     # Sidebar
     # selection box for the different features
@@ -52,19 +119,13 @@ def app():
     sex_selected = [st.sidebar.selectbox('Select sex', ['both', 'female', 'male'])]
     if sex_selected == ['both']:
         sex_selected = ['female', 'male']
-    age_selected = st.sidebar.slider("Age", int(df_deputies['age'].min()), int(
-        df_deputies['age'].max()), (int(df_deputies['age'].min()), int(df_deputies['age'].max())), 1)
-    nb_members_selected = st.sidebar.slider("Number of members", int(df_deputies['pol party'].value_counts().min()), int(
-        df_deputies['pol party'].value_counts().max()), (int(df_deputies['pol party'].value_counts().min()), int(df_deputies['pol party'].value_counts().max())), 1)
-
-    # creates masks from the sidebar selection widgets
-    mask_pol_parties = df_deputies['pol party'].isin(pol_party_selected)
-    mask_sex = df_deputies['sex'].isin(sex_selected)
-    mask_age = df_deputies['age'].between(age_selected[0], age_selected[1])
-    mask_nb_members = df_deputies['pol party'].value_counts().between(
-        nb_members_selected[0], nb_members_selected[1]).to_frame()
-    mask_nb_members = mask_nb_members[mask_nb_members['pol party'] == 1].index.to_list()
-    mask_nb_members = df_deputies['pol party'].isin(mask_nb_members)
+    age_min, age_max = int(cube.labels['age'].min()), int(cube.labels['age'].max())
+    age_selected = st.sidebar.slider("Age", age_min, age_max, (age_min, age_max), 1)
+    members = cube.members()
+    nb_members_selected = st.sidebar.slider("Number of members", int(members.min()), int(members.max()),
+                                            (int(members.min()), int(members.max())), 1)
+
+    counts = get_home_counts(cube, pol_party_selected, sex_selected, age_selected, nb_members_selected)
 
     title_spacer1, title, title_spacer_2 = st.columns((.1, ROW, .1))
 
@@ -72,33 +133,28 @@ def app():
         st.title('French national assembly vizualisation tool')
         st.markdown("""
             This app performs simple vizualisation from the open data from the french national assembly!
-            The data used are for the period June 2017 to March 2021 (XVth legislature of the Fifth French Republic, President Macron)
+            The data used are for the period {} to {} ({}th legislature of the Fifth French Republic)
             * Use the menu on the left to select the data or the page you want to access
             * Your plots will appear below
-            * Data source (accessed mid march 2021): [national assembly open data](https://data.assemblee-nationale.fr/).
+            * Data source: [national assembly open data](https://data.assemblee-nationale.fr/).
             * The code can be accessed at [code](https://github.com/max-lutz/open-data-french-national-assembly).
-            """)
-
-    df_deputies_selected = df_deputies[mask_pol_parties & mask_sex & mask_age & mask_nb_members]
-    df_deputies_selected = df_deputies_selected.sort_values(by=['pol party'])
+            """.format(pd.Timestamp(legislature_info['first vote']).strftime('%B %Y'),
+                       pd.Timestamp(legislature_info['last vote']).strftime('%B %Y'), to_roman(legislature)))
 
     # Political parties
+    party_counts = counts['party']
+
     # merge the political parties dataframe with the selected deputies
-    df_with_selected_pol_parties = pd.merge(pd.DataFrame(
-        df_deputies_selected['pol party'].value_counts()), df_pol_parties, left_index=True, right_on='abreviated_name')
+    df_with_selected_pol_parties = pd.merge(party_counts.to_frame(), df_pol_parties,
+                                            left_index=True, right_on='abreviated_name')
     colors = df_with_selected_pol_parties['color'].tolist()
 
     row0_spacer1, row0_1, row0_spacer2, row0_2, row0_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
     # donut plot that represent the number of deputies per political parties
-    with row0_1, _lock:
+    with row0_1:
         st.header("Political parties")
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(df_deputies_selected['pol party'].value_counts(), labels=(df_deputies_selected['pol party'].value_counts().index + ' (' + df_deputies_selected['pol party'].value_counts().map(str) + ')'),
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=colors)
-        p = plt.gcf()
-        p.gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+        st_figure('home/political parties', (party_counts, colors), draw_counts_donut, spec_counts_donut)
 
     # display full name of political parties
     with row0_2:
@@ -114,23 +170,18 @@ def app():
     # Age repartition
     row1_spacer1, row1_1, row1_spacer2, row1_2, row1_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
-    with row1_1, _lock:
+    with row1_1:
         st.header('Age repartition')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax = sns.histplot(data=df_deputies_selected, x="age", bins=12, stat="probability")
-        st.pyplot(fig)
+        st_figure('home/age', (counts['age'],), draw_age_histogram, spec_age_histogram)
 
     # Percentage of women per parties
     row2_spacer1, row2_1, row2_spacer2, row2_2, row2_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
     # calculate the proportion of women per parties
-    df_sex = pd.concat([df_deputies[mask_pol_parties & mask_nb_members].drop(columns=['code', 'activity', 'age']),
-                        pd.get_dummies(df_deputies[mask_pol_parties & mask_nb_members].drop(columns=['code', 'activity', 'age'])['sex'],
-                        prefix='sex')], axis=1)
-    df_sex = df_sex.groupby(['pol party']).agg({'sex_female': 'sum', 'sex_male': 'sum'})
-    df_sex['pol party'] = df_sex.index
-    df_sex['total'] = df_sex['sex_female'].astype(int) + df_sex['sex_male'].astype(int)
-    df_sex['sex_female'] = df_sex['sex_female'].astype(int)/df_sex['total']
+    df_sex = counts['sex']
+    df_sex['pol party'] = df_sex.index.astype(str)
+    df_sex['total'] = df_sex['sex_female'] + df_sex['sex_male']
+    df_sex['sex_female'] = df_sex['sex_female']/df_sex['total']
 
     # select correct political party colors
     df_sex = df_sex.reset_index(drop=True)
@@ -143,21 +194,10 @@ def app():
     df_sex = df_sex.sort_values(by=['sex_female'], ascending=False)
     colors = df_sex['color'].tolist()
 
-    with row2_1, _lock:
+    with row2_1:
         st.header('Women deputies')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        sns.barplot(x="sex_female", y="pol party", data=df_sex, ax=ax, palette=colors)
-        ax.set_ylabel('Political party')
-        ax.set_xlabel('Percentage of women deputies')
-
-        i = 0
-        text = (df_sex['sex_female'].round(2)*100).astype(int).to_list()
-        for rect in ax.patches:
-            height = rect.get_height()
-            ax.text(rect.get_x() + rect.get_width() / 2., rect.get_y() + height * 3 / 4.,
-                    str(text[i])+'%', ha='center', va='bottom', rotation=0, color='white', fontsize=12)
-            i = i + 1
-        st.pyplot(fig)
+        st_figure('home/women', (df_sex[['sex_female', 'pol party']].reset_index(drop=True), colors),
+                  draw_women_barplot, spec_women_barplot)
 
     # Job repartition
 
@@ -174,17 +214,14 @@ def app():
 
     row3_spacer1, row3_1, row3_spacer2, row3_2, row3_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
-    with row3_1, _lock:
+    activity_counts = counts['activity']
+
+    with row3_1:
         st.header('Previous job repartition')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(df_deputies_selected['activity'].value_counts(), labels=(df_deputies_selected['activity'].value_counts(
-        ).index + ' (' + df_deputies_selected['activity'].value_counts().map(str) + ')'), wedgeprops={'linewidth': 7, 'edgecolor': 'white'})
-        p = plt.gcf()
-        p.gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+        st_figure('home/activity', (activity_counts, None), draw_counts_donut, spec_counts_donut)
 
     with row3_2:
-        job_list = df_deputies_selected['activity'].value_counts().index
+        job_list = activity_counts.index
         text = ''
         for i in range(len(job_list)):
             text = text + job_list[i] + ' : ' + job_description[job_list[i]] + '  \n'
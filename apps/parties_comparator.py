@@ -1,61 +1,17 @@
 import streamlit as st
 import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
 import seaborn as sns
 import numpy as np
-import os
-from matplotlib.backends.backend_agg import RendererAgg
-from datetime import date
-
-# Loading the data
-
-
-@st.cache_data
-def get_data_deputies():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_dep.csv'))
-    # create the value age from the date of birth of the deputies
-    df['age'] = df['date of birth'].astype(str).str[0:4]
-    df['age'] = date.today().year - df['age'].astype(int)
-    df = df.drop(columns=['family name', 'first name', 'date of birth'])
-    return df
-
-
-@st.cache_data
-def get_data_political_parties():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_polpar.csv'))
-    df = df.drop(columns=['code'])
-    df = df.rename(columns={"abreviated_name": "pol party"})
-    return df
-
-
-@st.cache_data
-def get_data_votes():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_vote_descr.csv'))
-    df['year'] = df['date'].astype(str).str[0:4]
-    df['month'] = df['date'].astype(str).str[5:7]
-    df['day'] = df['date'].astype(str).str[8:10]
-    df['datetime'] = pd.to_datetime(df[['year', 'month', 'day']], errors='coerce')
-    df['percentage of votes in favor'] = 100*df['pour']/df['nb votants']
-    df['accepted'] = 'no'
-    df.loc[df['pour'] >= df['requis'], 'accepted'] = 'yes'
-    df = df.drop(columns=['date'])
-    df.columns = df.columns.str.replace('demandeur ', '')
-    return df
-
-
-@st.cache_data
-def get_data_vote_total():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_vote_total.csv'),
-                     dtype={
-        'pour': bool,
-        'contre': bool,
-        'abstentions': bool,
-        'par delegation': bool
-    })
-    df['deputy code'] = df['deputy code'].astype("category")
-    df['scrutin'] = df['scrutin'].astype("category")
-    return df
+from data_store import get_data_deputies, get_data_political_parties, get_selected_legislature
+from aggregates import get_party_agreement, get_party_cohesion, get_party_vote_ratios
+import client_charts
+from figure_cache import st_figure
+
+# datasets loaded by the app before the page runs
+DATASETS = ['deputies', 'political parties']
+
 
 ###
 # This function allows to plot graphs while highlighting one political party.
@@ -93,6 +49,107 @@ def get_label_plot_political_parties(df_dep, deputies_count):
     text = text + df_dep['pol party'].value_counts().map(str).to_list()[0] + '\n('
     return text + str(round(100*df_dep['pol party'].value_counts().to_list()[0]/deputies_count, 2)) + '%)'
 
+###
+# Returns the number of deputies per previous activity, leaving out the activities nobody in the group had
+
+
+def get_activity_counts(df_dep):
+    activity_counts = df_dep['activity'].value_counts()
+    activity_counts = activity_counts[activity_counts > 0]
+    activity_counts.index = activity_counts.index.astype(str)
+    return activity_counts
+
+###
+# Charts of the page, each one is drawn for the two selected parties
+# They are only drawn when the figure cache does not hold them already
+
+
+def draw_members_donut(counts, colors, label):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    ax.pie(counts, labels=counts.index, wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=colors)
+    ax.annotate(label, xy=(0, -0.15), fontsize=22, ha='center')
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+    return fig
+
+
+def spec_members_donut(counts, colors, label):
+    return client_charts.donut(counts.index, counts, colors, label)
+
+
+def draw_age_histogram(df_age, palette):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    sns.histplot(data=df_age, x="age", bins=12, stat="probability", palette=palette, ax=ax)
+    return fig
+
+
+def spec_age_histogram(df_age, palette):
+    return client_charts.histogram(df_age['age'], 12, 'probability', xlabel='age')
+
+
+def draw_party_barplot(df, x, party, xlabel, text):
+    # bar plot of all the parties where the selected party is highlighted and its value written in its rectangle
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    sns.barplot(x=x, y="pol party", data=df, ax=ax, palette=apply_grey_filter(df, party))
+    rect = ax.patches[int(np.where(df['pol party'] == party)[0])]
+    ax.text(rect.get_x() + rect.get_width() / 2., rect.get_y() + rect.get_height() * 3 / 4.,
+            str(text)+'%', ha='center', va='bottom', rotation=0, color='black', fontsize=12)
+    ax.set(xlabel=xlabel, ylabel=None, xticklabels=[])
+    return fig
+
+
+def spec_party_barplot(df, x, party, xlabel, text):
+    texts = [str(text)+'%' if pol_party == party else '' for pol_party in df['pol party']]
+    return client_charts.barplot(df['pol party'], df[x], apply_grey_filter(df, party), xlabel, None, texts)
+
+
+def draw_activity_donut(activity_counts):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    ax.pie(activity_counts, labels=(activity_counts.index + ' (' + activity_counts.map(str) + ')'),
+           wedgeprops={'linewidth': 7, 'edgecolor': 'white'})
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+    return fig
+
+
+def spec_activity_donut(activity_counts):
+    return client_charts.donut(activity_counts.index + ' (' + activity_counts.map(str) + ')', activity_counts)
+
+
+def draw_vote_repartition_donut(vote_repartition_n):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    ax.pie(vote_repartition_n, labels=['pour ('+str(vote_repartition_n[0])+'%)',
+                                       'contre ('+str(vote_repartition_n[1])+'%)',
+                                       'abstentions ('+str(vote_repartition_n[2])+'%)'],
+           wedgeprops={'linewidth': 7, 'edgecolor': 'white'},
+           colors=['green', 'red', 'grey'])
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+    return fig
+
+
+def spec_vote_repartition_donut(vote_repartition_n):
+    labels = ['pour ('+str(vote_repartition_n[0])+'%)', 'contre ('+str(vote_repartition_n[1])+'%)',
+              'abstentions ('+str(vote_repartition_n[2])+'%)']
+    return client_charts.donut(labels, vote_repartition_n, ['green', 'red', 'grey'])
+
+
+def draw_agreement_heatmap(df_agreement):
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.heatmap(df_agreement*100, ax=ax, cmap='RdYlGn', vmin=0, vmax=100, annot=True, fmt='.0f', square=True,
+                linewidth=0.01, linecolor="#222", cbar_kws={'label': 'Percentage of votes with the same position'})
+    ax.set(xlabel=None, ylabel=None)
+    fig.tight_layout()
+    return fig
+
+
+def spec_agreement_heatmap(df_agreement):
+    return client_charts.heatmap(df_agreement*100, sns.color_palette('RdYlGn', 10),
+                                 'Percentage of votes with the same position', robust=False)
+
 ###
 # Main application of parties comparator
 # This function allows the user to compare two different parties
@@ -102,17 +159,14 @@ def get_label_plot_political_parties(df_dep, deputies_count):
 def app():
     # configuration of the page
     # st.set_page_config(layout="wide")
-    matplotlib.use("agg")
-    _lock = RendererAgg.lock
 
     SPACER = .2
     ROW = 1
 
     # load dataframes
-    df_deputies = get_data_deputies()
-    df_pol_parties = get_data_political_parties()
-    df_votes = get_data_votes()
-    df_vote_total = get_data_vote_total()
+    legislature = get_selected_legislature()
+    df_deputies = get_data_deputies(legislature)
+    df_pol_parties = get_data_political_parties(legislature).rename(columns={"abreviated_name": "pol party"})
 
     title_spacer1, title, title_spacer_2 = st.columns((.1, ROW, .1))
     with title:
@@ -120,66 +174,57 @@ def app():
 
     # Select box and description
     row0_spacer1, row0_1, row0_spacer2, row0_2, row0_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
-    with row0_1, _lock:
-        party_1 = st.selectbox('Select political party', df_deputies['pol party'].unique(), index=6, key='1')
+    with row0_1:
+        party_1 = st.selectbox('Select political party', df_deputies['pol party'].unique().tolist(), index=6, key='1')
         st.write(get_party_description(party_1))
         deputies_group_1 = df_deputies[df_deputies['pol party'] == party_1]
 
-    with row0_2, _lock:
-        party_2 = st.selectbox('Select political party', df_deputies['pol party'].unique(), index=1, key='2')
+    with row0_2:
+        party_2 = st.selectbox('Select political party', df_deputies['pol party'].unique().tolist(), index=1, key='2')
         st.write(get_party_description(party_2))
         deputies_group_2 = df_deputies[df_deputies['pol party'] == party_2]
 
     # Political parties
+    members_counts = df_deputies['pol party'].value_counts()
     row1_spacer1, row1_1, row1_spacer2, row1_2, row1_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
-    with row1_1, _lock:
+    with row1_1:
         df_display_pol_parties = df_pol_parties.sort_values(by=['members'], ascending=False)
 
         st.header("Number of members")
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(df_deputies['pol party'].value_counts(), labels=(df_deputies['pol party'].value_counts().index),
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=apply_grey_filter(df_display_pol_parties, party_1))
-        label = ax.annotate(get_label_plot_political_parties(deputies_group_1, len(
-            df_deputies.index)), xy=(0, -0.15), fontsize=22, ha='center')
-        plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
-
-    with row1_2, _lock:
+        st_figure('comparator/members', (members_counts, apply_grey_filter(df_display_pol_parties, party_1),
+                                         get_label_plot_political_parties(deputies_group_1, len(df_deputies.index))),
+                  draw_members_donut, spec_members_donut)
+
+    with row1_2:
         df_display_pol_parties = df_pol_parties.sort_values(by=['members'], ascending=False)
 
         st.header("Number of members")
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(df_deputies['pol party'].value_counts(), labels=(df_deputies['pol party'].value_counts().index),
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=apply_grey_filter(df_display_pol_parties, party_2))
-        label = ax.annotate(get_label_plot_political_parties(deputies_group_2, len(
-            df_deputies.index)), xy=(0, -0.15), fontsize=22, ha='center')
-        plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+        st_figure('comparator/members', (members_counts, apply_grey_filter(df_display_pol_parties, party_2),
+                                         get_label_plot_political_parties(deputies_group_2, len(df_deputies.index))),
+                  draw_members_donut, spec_members_donut)
 
     # Age repartition
     row2_spacer1, row2_1, row2_spacer2, row2_2, row2_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
-    with row2_1, _lock:
+    with row2_1:
         st.header('Age repartition')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax = sns.histplot(data=deputies_group_1, x="age", bins=12, stat="probability",
-                          palette=df_pol_parties.loc[df_pol_parties['pol party'] == party_1]['color'])
-        st.pyplot(fig)
+        st_figure('comparator/age', (deputies_group_1[['age']].reset_index(drop=True),
+                                     df_pol_parties.loc[df_pol_parties['pol party'] == party_1, 'color'].tolist()),
+                  draw_age_histogram, spec_age_histogram)
 
-    with row2_2, _lock:
+    with row2_2:
         st.header('Age repartition')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax = sns.histplot(data=deputies_group_2, x="age", bins=12, stat="probability",
-                          palette=df_pol_parties.loc[df_pol_parties['pol party'] == party_2]['color'])
-        st.pyplot(fig)
+        st_figure('comparator/age', (deputies_group_2[['age']].reset_index(drop=True),
+                                     df_pol_parties.loc[df_pol_parties['pol party'] == party_2, 'color'].tolist()),
+                  draw_age_histogram, spec_age_histogram)
 
     # Percentage of women per parties
     row3_spacer1, row3_1, row3_spacer2, row3_2, row3_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
     # caluculate the proportion of women per parties
-    df_sex = pd.concat([df_deputies.drop(columns=['code', 'activity', 'age']), pd.get_dummies(
-        df_deputies.drop(columns=['code', 'activity', 'age'])['sex'], prefix='sex')], axis=1)
-    df_sex = df_sex.groupby(['pol party']).agg({'sex_female': 'sum', 'sex_male': 'sum'})
-    df_sex['pol party'] = df_sex.index
+    df_sex = df_deputies[['pol party', 'sex']]
+    df_sex = pd.concat([df_sex, pd.get_dummies(df_sex['sex'], prefix='sex')], axis=1)
+    df_sex = df_sex.groupby(['pol party'], observed=True).agg({'sex_female': 'sum', 'sex_male': 'sum'})
+    df_sex['pol party'] = df_sex.index.astype(str)
     df_sex['total'] = df_sex['sex_female'].astype(int) + df_sex['sex_male'].astype(int)
     df_sex['sex_female'] = df_sex['sex_female'].astype(int)/df_sex['total']
 
@@ -191,129 +236,96 @@ def app():
     df_sex['color'] = df_with_selected_pol_parties['color'].tolist()
     df_sex = df_sex.sort_values(by=['sex_female'], ascending=False).reset_index(drop=True)
 
-    with row3_1, _lock:
+    with row3_1:
         st.header('Percentage of women deputies')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        sns.barplot(x="sex_female", y="pol party", data=df_sex, ax=ax, palette=apply_grey_filter(df_sex, party_1))
         # write the percentage value in the rectangle of party 1 in the barplot
         text = (df_sex['sex_female'].round(2) *
                 100).astype(int).to_list()[int(np.where(df_sex['pol party'] == party_1)[0])]
-        rect = ax.patches[int(np.where(df_sex['pol party'] == party_1)[0])]
-        ax.text(rect.get_x() + rect.get_width() / 2., rect.get_y() + rect.get_height() * 3 / 4.,
-                str(text)+'%', ha='center', va='bottom', rotation=0, color='black', fontsize=12)
-        ax.set(xlabel=None, ylabel=None, xticklabels=[])
-        st.pyplot(fig)
+        st_figure('comparator/women', (df_sex[['sex_female', 'pol party', 'color']], 'sex_female', party_1, None, text),
+                  draw_party_barplot, spec_party_barplot)
 
-    with row3_2, _lock:
+    with row3_2:
         st.header('Percentage of women deputies')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        sns.barplot(x="sex_female", y="pol party", data=df_sex, ax=ax, palette=apply_grey_filter(df_sex, party_2))
         # write the percentage value in the rectangle of party 2 in the barplot
         text = (df_sex['sex_female'].round(2) *
                 100).astype(int).to_list()[int(np.where(df_sex['pol party'] == party_2)[0])]
-        rect = ax.patches[int(np.where(df_sex['pol party'] == party_2)[0])]
-        ax.text(rect.get_x() + rect.get_width() / 2., rect.get_y() + rect.get_height() * 3 / 4.,
-                str(text)+'%', ha='center', va='bottom', rotation=0, color='black', fontsize=12)
-        ax.set(xlabel=None, ylabel=None, xticklabels=[])
-        st.pyplot(fig)
+        st_figure('comparator/women', (df_sex[['sex_female', 'pol party', 'color']], 'sex_female', party_2, None, text),
+                  draw_party_barplot, spec_party_barplot)
 
     # Job repartition
     row4_spacer1, row4_1, row4_spacer2, row4_2, row4_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
-    with row4_1, _lock:
+    activity_counts_1 = get_activity_counts(deputies_group_1)
+    activity_counts_2 = get_activity_counts(deputies_group_2)
+
+    with row4_1:
         st.header('Previous job repartition')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(deputies_group_1['activity'].value_counts(), labels=(deputies_group_1['activity'].value_counts(
-        ).index + ' (' + deputies_group_1['activity'].value_counts().map(str) + ')'), wedgeprops={'linewidth': 7, 'edgecolor': 'white'})
-        plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+        st_figure('comparator/activity', (activity_counts_1,), draw_activity_donut, spec_activity_donut)
 
-    with row4_2, _lock:
+    with row4_2:
         st.header('Previous job repartition')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(deputies_group_2['activity'].value_counts(), labels=(deputies_group_2['activity'].value_counts(
-        ).index + ' (' + deputies_group_2['activity'].value_counts().map(str) + ')'), wedgeprops={'linewidth': 7, 'edgecolor': 'white'})
-        plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+        st_figure('comparator/activity', (activity_counts_2,), draw_activity_donut, spec_activity_donut)
 
     # Average presence / average vote (for, against, absent)
 
     # get the average presence to the votes and average position of each party
-    nb_votes = len(df_vote_total['scrutin'].unique())
-    df_vote_total = pd.merge(df_vote_total, df_deputies.drop(
-        columns=['sex', 'activity', 'age']), left_on='deputy code', right_on='code')
-    df_vote_total['vote'] = 1
-    for column in ['pour', 'contre', 'abstentions', 'par delegation']:
-        df_vote_total[column] = df_vote_total[column].astype(int)
-
-    # Sum all votes of deputies per party
-    df_vote_total = df_vote_total.drop(columns=['scrutin', 'deputy code']).groupby(['pol party']).agg(
-        {'pour': 'sum', 'contre': 'sum', 'abstentions': 'sum', 'par delegation': 'sum', 'vote': 'sum'})
-    df_vote_total = pd.merge(df_vote_total, df_pol_parties.drop(
-        columns=['name']), left_on='pol party', right_on='pol party')
-
-    # calculate the average presence to the votes and average position of each party
-    for column in ['vote', 'pour', 'contre', 'abstentions', 'par delegation']:
-        df_vote_total[column] = df_vote_total[column]/(df_vote_total['members']*nb_votes)
-    df_vote_total = df_vote_total.sort_values(by=['vote'], ascending=False).reset_index(drop=True)
+    # it does not depend on the selected parties and is computed once from the vote matrix
+    df_party_votes = get_party_vote_ratios(legislature)
 
     row5_spacer1, row5_1, row4_spacer2, row5_2, row5_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
-    with row5_1, _lock:
+    with row5_1:
         st.header("Presence to the votes")
-        fig, ax = plt.subplots(figsize=(5, 5))
-        sns.barplot(x="vote", y="pol party", data=df_vote_total, ax=ax,
-                    palette=apply_grey_filter(df_vote_total, party_1))
-        text = (df_vote_total['vote'].round(4) *
-                100).astype(float).round(4).to_list()[int(np.where(df_sex['pol party'] == party_1)[0])]
-        rect = ax.patches[int(np.where(df_vote_total['pol party'] == party_1)[0])]
-        ax.text(rect.get_x() + rect.get_width() / 2., rect.get_y() + rect.get_height() * 3 / 4.,
-                str(text)+'%', ha='center', va='bottom', rotation=0, color='black', fontsize=12)
-        ax.set(xlabel='Average percentage of deputies at each vote', ylabel=None, xticklabels=[])
-        st.pyplot(fig)
-
-    with row5_2, _lock:
+        text = (df_party_votes['vote'].round(4) *
+                100).astype(float).round(4).to_list()[int(np.where(df_party_votes['pol party'] == party_1)[0])]
+        st_figure('comparator/presence', (df_party_votes[['vote', 'pol party', 'color']], 'vote', party_1,
+                                          'Average percentage of deputies at each vote', text),
+                  draw_party_barplot, spec_party_barplot)
+
+    with row5_2:
         st.header("Presence to the votes")
-        fig, ax = plt.subplots(figsize=(5, 5))
-        sns.barplot(x="vote", y="pol party", data=df_vote_total, ax=ax,
-                    palette=apply_grey_filter(df_vote_total, party_2))
-        text = (df_vote_total['vote'].round(4) *
-                100).astype(float).round(4).to_list()[int(np.where(df_sex['pol party'] == party_2)[0])]
-        rect = ax.patches[int(np.where(df_vote_total['pol party'] == party_2)[0])]
-        ax.text(rect.get_x() + rect.get_width() / 2., rect.get_y() + rect.get_height() * 3 / 4.,
-                str(text)+'%', ha='center', va='bottom', rotation=0, color='black', fontsize=12)
-        ax.set(xlabel='Average percentage of deputies at each vote', ylabel=None, xticklabels=[])
-        st.pyplot(fig)
+        text = (df_party_votes['vote'].round(4) *
+                100).astype(float).round(4).to_list()[int(np.where(df_party_votes['pol party'] == party_2)[0])]
+        st_figure('comparator/presence', (df_party_votes[['vote', 'pol party', 'color']], 'vote', party_2,
+                                          'Average percentage of deputies at each vote', text),
+                  draw_party_barplot, spec_party_barplot)
 
     # Vote repartition
     row6_spacer1, row6_1, row6_spacer2, row6_2, row6_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
-    df_vote_total = df_vote_total.set_index('pol party')
-    vote_repartition = df_vote_total.loc[party_1, ['pour', 'contre', 'abstentions']].to_list()
+    df_party_votes = df_party_votes.set_index('pol party')
+    vote_repartition = df_party_votes.loc[party_1, ['pour', 'contre', 'abstentions']].to_list()
     vote_repartition_n = vote_repartition/(sum(vote_repartition)/100)
     vote_repartition_n = vote_repartition_n.round(1)
 
-    with row6_1, _lock:
+    with row6_1:
         st.header('Vote repartition for '+party_1)
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(vote_repartition_n, labels=['pour ('+str(vote_repartition_n[0])+'%)',
-                                           'contre ('+str(vote_repartition_n[1])+'%)',
-                                           'abstentions ('+str(vote_repartition_n[2])+'%)'],
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'},
-               colors=['green', 'red', 'grey'])
-        plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
-
-    vote_repartition = df_vote_total.loc[party_2, ['pour', 'contre', 'abstentions']].to_list()
+        st_figure('comparator/vote repartition', (vote_repartition_n,), draw_vote_repartition_donut,
+                  spec_vote_repartition_donut)
+
+    vote_repartition = df_party_votes.loc[party_2, ['pour', 'contre', 'abstentions']].to_list()
     vote_repartition_n = vote_repartition/(sum(vote_repartition)/100)
     vote_repartition_n = vote_repartition_n.round(1)
 
-    with row6_2, _lock:
+    with row6_2:
         st.header('Vote repartition for '+party_2)
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(vote_repartition_n, labels=['pour ('+str(vote_repartition_n[0])+'%)',
-                                           'contre ('+str(vote_repartition_n[1])+'%)',
-                                           'abstentions ('+str(vote_repartition_n[2])+'%)'],
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'},
-               colors=['green', 'red', 'grey'])
-        plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+        st_figure('comparator/vote repartition', (vote_repartition_n,), draw_vote_repartition_donut,
+                  spec_vote_repartition_donut)
+
+    # Cohesion and agreement
+    # the majority position of each party on each vote and its Rice index (1 when all the deputies of the party who
+    # voted pour or contre voted the same way, 0 when they split in half) are computed once from the vote matrix
+    party_cohesion = get_party_cohesion(legislature)
+    df_agreement = get_party_agreement(legislature)
+
+    row7_spacer1, row7_1, row7_spacer2, row7_2, row7_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
+    for row, party, other_party in [(row7_1, party_1, party_2), (row7_2, party_2, party_1)]:
+        with row:
+            st.header('Cohesion of '+party)
+            st.write('Average Rice index : ' + str(round(party_cohesion[party], 2)))
+            st.write('Same position as ' + other_party + ' on ' +
+                     str(round(100*df_agreement.loc[party, other_party], 1)) + '% of the votes')
+
+    row8_spacer1, row8_1, row8_spacer2 = st.columns((SPACER, ROW, SPACER))
+    with row8_1:
+        st.header('Agreement between the political parties')
+        st_figure('comparator/agreement', (df_agreement,), draw_agreement_heatmap, spec_agreement_heatmap)
@@ -1,58 +1,97 @@
 import streamlit as st
 import pandas as pd
-import matplotlib
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle
 import seaborn as sns
-import os
-from matplotlib.backends.backend_agg import RendererAgg
+from aggregates import get_vote_calendar, get_vote_requests
+from data_store import get_data_votes, get_selected_legislature, get_vote_years
+import client_charts
+from figure_cache import st_figure
+from indexes import get_scrutin_index
 
-# Loading the data
+# datasets loaded by the app before the page runs,
+# the votes are loaded by the page itself, only for the selected years
+# (the number of deputies is needed by the presence heatmap)
+DATASETS = ['deputies', 'political parties']
 
+###
+# Charts of the page, they are only drawn when the figure cache does not hold them already
 
-@st.cache_data
-def get_data_votes():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_vote_descr.csv'))
-    df['year'] = df['date'].astype(str).str[0:4]
-    df['month'] = df['date'].astype(str).str[5:7]
-    df['day'] = df['date'].astype(str).str[8:10]
-    df['datetime'] = pd.to_datetime(df[['year', 'month', 'day']], errors='coerce')
-    df['percentage of votes in favor'] = 100*df['pour']/df['nb votants']
-    df['accepted'] = 'no'
-    df.loc[df['pour'] >= df['requis'], 'accepted'] = 'yes'
-    df = df.drop(columns=['date'])
-    df.columns = df.columns.str.replace('demandeur ', '')
-    return df
 
+def draw_histogram(df, x, hue, xlabel):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    sns.histplot(data=df, x=x, hue=hue, bins=40, ax=ax)
+    if xlabel is not None:
+        ax.set_xlabel(xlabel)
+    return fig
 
-@st.cache_data
-def get_data_deputies():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_dep.csv'))
-    df = df.drop(columns=['family name', 'first name', 'date of birth'])
-    return df
 
+def spec_histogram(df, x, hue, xlabel):
+    return client_charts.histogram(df[x], 40, hue=None if hue is None else df[hue],
+                                   xlabel=x if xlabel is None else xlabel)
 
-@st.cache_data
-def get_data_political_parties():
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'df_polpar.csv'))
-    df = df.drop(columns=['code'])
-    return df
+
+def draw_heatmap(df_heatmap, palette, heatmap_title):
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+    sns.heatmap(df_heatmap,
+                ax=ax,
+                cmap=palette,  # Choose a squential colormap
+                annot_kws={'fontsize': 11},  # Reduce size of label to fit
+                fmt='',          # Interpret labels as strings
+                square=True,     # Force square cells
+                linewidth=0.01,  # Add gridlines
+                linecolor="#222",  # Adjust gridline color
+                robust=True
+                )
+    ax.set_title(heatmap_title)
+    ax.set_ylabel('Month of the year')
+    ax.set_xlabel('Days of the month')
+    fig.tight_layout()
+    return fig
+
+
+def spec_heatmap(df_heatmap, palette, heatmap_title):
+    return client_charts.heatmap(df_heatmap, palette, heatmap_title, 'Days of the month', 'Month of the year')
+
+
+def draw_demand_donut(values, labels, colors):
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    ax.pie(values, labels=labels, wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=colors)
+    ax.add_artist(Circle((0, 0), 0.7, color='white'))
+    return fig
+
+
+def spec_demand_donut(values, labels, colors):
+    return client_charts.donut(labels, values, colors)
 
 
 def app():
     # configuration of the page
     # st.set_page_config(layout="wide")
-    matplotlib.use("agg")
-    _lock = RendererAgg.lock
 
     SPACER = .2
     ROW = 1
 
-    df_votes = get_data_votes()
-    df_polpar = get_data_political_parties()
+    legislature = get_selected_legislature()
 
     # Sidebar
     # selection box for the different features
     st.sidebar.header('Select what to display')
+    # only the vote partitions of the selected years are loaded
+    vote_years = get_vote_years(legislature)
+    if not vote_years:
+        st.warning('No vote recorded in this legislature')
+        return
+    years_selected = st.sidebar.multiselect('Years', vote_years, vote_years)
+    if not years_selected:
+        years_selected = vote_years
+    df_votes = get_data_votes(legislature, years_selected)
+    if df_votes.empty:
+        st.warning('No vote in the selected years')
+        return
     nb_voters = st.sidebar.slider("Number of voters", int(df_votes['nb votants'].min()), int(
         df_votes['nb votants'].max()), (int(df_votes['nb votants'].min()), int(df_votes['nb votants'].max())), 1)
 
@@ -68,25 +107,41 @@ def app():
 
     row0_spacer1, row0_1, row0_spacer2 = st.columns((SPACER/2, ROW, SPACER/2))
     with row0_1:
-        st.header('Data (all the votes from June 2017 to mid March 2021)')
+        st.header('Data (all the votes from {} to {})'.format(df_votes['datetime'].min().strftime('%B %Y'),
+                                                               df_votes['datetime'].max().strftime('%B %Y')))
     # st.write(df_votes_selected)
 
+    # Search of the votes by words of their title or requester, answered by an inverted index of all the scrutins
+    row_search_spacer1, row_search_1, row_search_spacer2 = st.columns((SPACER/2, ROW, SPACER/2))
+    with row_search_1:
+        query = st.text_input('Search a vote (words of the title or of the requester)')
+        if query:
+            scrutin_index = get_scrutin_index(legislature)
+            positions, scores = scrutin_index.search(query, limit=50)
+            df_found = pd.DataFrame({'code': scrutin_index.codes[positions]}).merge(df_votes, on='code')
+            if df_found.empty:
+                st.write('No vote found in the selected years')
+            else:
+                df_found = pd.DataFrame({'Date': df_found['datetime'].dt.strftime('%Y-%m-%d'),
+                                         'Title': df_found['titre'], 'Requester': df_found['demandeur'],
+                                         'Pour': df_found['pour'], 'Contre': df_found['contre'],
+                                         'Accepted': df_found['accepted']})
+                st.dataframe(df_found.head(20), use_container_width=True)
+
     # Vote repartition
     row1_spacer1, row1_1, row1_spacer2, row1_2, row1_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
-    with row1_1, _lock:
+    with row1_1:
         st.header('Repartition of vote presence')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax = sns.histplot(data=df_votes_selected, x="nb votants", hue="accepted", bins=40)
-        ax.set_xlabel('Number of deputies voting')
-        st.pyplot(fig)
+        st_figure('votes/presence', (df_votes_selected[['nb votants', 'accepted']].reset_index(drop=True),
+                                     "nb votants", "accepted", 'Number of deputies voting'),
+                  draw_histogram, spec_histogram)
 
-    with row1_2, _lock:
+    with row1_2:
         st.header('Repartition of votes in favor')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax = sns.histplot(data=df_votes_selected, x="percentage of votes in favor", bins=40)
         # ax = sns.scatterplot(data=df_votes_selected, x="nb votants", y="percentage of votes in favor")
-        st.pyplot(fig)
+        st_figure('votes/in favor', (df_votes_selected[['percentage of votes in favor']].reset_index(drop=True),
+                                     "percentage of votes in favor", None, None), draw_histogram, spec_histogram)
 
     # heatmap (12;31) with a year selector and a data selector (nb of votes or presence)
     title_spacer2, title_2, title_spacer_2 = st.columns((.1, ROW, .1))
@@ -95,89 +150,46 @@ def app():
         st.header('Heatmap of the votes during the year')
 
     row2_spacer1, row2_1, row2_spacer2, row2_2, row2_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
-    with row2_1, _lock:
-        year_selected = st.selectbox('Select year', ['2017', '2018', '2019', '2020', '2021'], key='1')
+    with row2_1:
+        year_selected = st.selectbox('Select year', years_selected, key='1')
 
-    with row2_2, _lock:
+    with row2_2:
         data_selected = st.selectbox('Select data', ['Nb of votes', 'Deputy presence'], key='2')
 
-    df_heatmap = df_votes_selected.drop(
-        columns=['code', 'type', 'titre', 'demandeur', 'requis', 'pour', 'contre', 'abstentions', 'datetime'])
-    df_heatmap = df_heatmap.loc[df_heatmap['year'] == year_selected]
-    df_heatmap['count'] = 1
-    df_heatmap['nb votants'] = df_heatmap['nb votants']/574
-    df_heatmap['nb votants'] = (df_heatmap['nb votants']*100).astype(int)
-
-    df_heatmap = df_heatmap.groupby(['year', 'month', 'day']).agg({'nb votants': 'mean', 'count': 'sum'})
-
+    # the days of the scrutins of the selected year and number of voters, from the precomputed calendar
+    calendar = get_vote_calendar(legislature, year_selected)
     if (data_selected == 'Nb of votes'):
-        df_heatmap = df_heatmap.reset_index().pivot(index='month', columns='day', values='count')
+        df_heatmap = calendar.grid('count', nb_voters)
         heatmap_title = 'Number of votes at the national assembly on a particular day'
     elif (data_selected == 'Deputy presence'):
-        df_heatmap = df_heatmap.reset_index().pivot(index='month', columns='day', values='nb votants').astype(float)
+        df_heatmap = calendar.grid('presence', nb_voters)
         heatmap_title = 'Percentage of deputy presence at the national assembly on a particular day'
 
-    df_heatmap.fillna(0, inplace=True)
-    df_heatmap.columns = df_heatmap.columns.astype(int)
-    df_heatmap.index = df_heatmap.index.astype(int)
-    # Ensure all month in table
-    df_heatmap = df_heatmap.reindex(range(1, 13), axis=0, fill_value=0)
-    # Ensure all days in table
-    df_heatmap = df_heatmap.reindex(range(1, 32), axis=1, fill_value=0).astype(int)
-
     row3_spacer1, row3_1, row3_spacer2 = st.columns((SPACER, ROW, SPACER))
 
     palette = sns.color_palette("Greens", 12)
     palette[0] = (1, 1, 1)
 
-    with row3_1, _lock:
-        fig, ax = plt.subplots(figsize=(10, 4))
-        ax = sns.heatmap(df_heatmap,
-                         cmap=palette,  # Choose a squential colormap
-                         annot_kws={'fontsize': 11},  # Reduce size of label to fit
-                         fmt='',          # Interpret labels as strings
-                         square=True,     # Force square cells
-                         linewidth=0.01,  # Add gridlines
-                         linecolor="#222",  # Adjust gridline color
-                         robust=True
-                         )
-        ax.set_title(heatmap_title)
-        ax.set_ylabel('Month of the year')
-        ax.set_xlabel('Days of the month')
-        plt.tight_layout()
-        st.pyplot(fig)
+    with row3_1:
+        st_figure('votes/heatmap', (df_heatmap, palette, heatmap_title), draw_heatmap, spec_heatmap)
 
     row4_spacer1, row4_1, row4_spacer2, row4_2, row4_spacer3 = st.columns((SPACER, ROW, SPACER, ROW, SPACER))
 
-    # get the total number of demand from each party
-    df_demandeur = df_votes_selected.drop(df_votes_selected.columns[0:10], axis=1)
-    df_demandeur = df_demandeur.drop(df_demandeur.columns[-7:-1], axis=1)
-    df_demandeur = df_demandeur.sum(axis=0)
-    df_demandeur = df_demandeur.drop(labels=['ND', 'GOV', 'EELV', 'MODEM', 'CDP'])
-
-    # merge the dataframe with the number of demand with the polpar df to get colors and nb of members
-    df = df_polpar.set_index('abreviated_name').merge(pd.DataFrame(
-        data=[df_demandeur.values], columns=df_demandeur.index).T, left_index=True, right_index=True)
-    df.columns = ['name', 'members', 'color', 'demand']
-    df['demand per deputy'] = df['demand']/df['members']
+    # the number of demand from each party, from the long table of the requesters of each scrutin, with the colors
+    # and nb of members of the parties, only the political parties which requested a vote are kept
+    df = get_vote_requests(legislature, years_selected, df_votes_selected['code'])
 
-    with row4_1, _lock:
+    with row4_1:
         st.header('Number of law propositions')
         st.text('')
         st.text('')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(df['demand'], labels=(df.index + ' (' + df['demand'].map(str) + ')'),
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=df['color'].to_list())
-        p = plt.gcf()
-        p.gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
-
-    with row4_2, _lock:
+        st_figure('votes/demand', (df['demand'], (df.index + ' (' + df['demand'].map(str) + ')').tolist(),
+                                   df['color'].to_list()), draw_demand_donut, spec_demand_donut)
+
+    with row4_2:
         st.header('Average number of law propositions per deputy')
         st.text('')
-        fig, ax = plt.subplots(figsize=(5, 5))
-        ax.pie(df['demand per deputy'], labels=(df.index + ' (' + round(df['demand per deputy'].map(float)).map(str) + ')'),
-               wedgeprops={'linewidth': 7, 'edgecolor': 'white'}, colors=df['color'].to_list())
-        p = plt.gcf()
-        p.gca().add_artist(plt.Circle((0, 0), 0.7, color='white'))
-        st.pyplot(fig)
+        st_figure('votes/demand per deputy',
+                  (df['demand per deputy'],
+                   (df.index + ' (' + round(df['demand per deputy'].map(float)).map(str) + ')').tolist(),
+                   df['color'].to_list()), draw_demand_donut, spec_demand_donut)
@@ -0,0 +1,84 @@
+"""Server CPU time and bytes sent per chart with the matplotlib and vega-lite backends.
+
+The charts of the pages are recorded once (chart id, inputs, draw and spec
+functions), then each chart is produced as each backend would send it:
+    matplotlib  the figure is drawn and encoded to PNG, the bytes are the PNG
+    vega-lite   the data and spec are built and marshalled into the Streamlit
+                message, the bytes are the size of the message
+The figure cache is not used, so the matplotlib numbers are the cost of a
+cache miss. The CPU time is the process time of the server.
+
+Usage (from the root of the repository):
+    python benchmarks/chart_backends.py --repeat 3 --json chart_backends.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.elements import arrow_vega_lite  # noqa: E402
+from streamlit.proto.ArrowVegaLiteChart_pb2 import ArrowVegaLiteChart  # noqa: E402
+
+import figure_cache  # noqa: E402
+from page_charts import PAGES, record_charts  # noqa: E402
+
+BACKENDS = ['matplotlib', 'vega-lite']
+
+
+def send_matplotlib(inputs, draw, spec):
+    return len(figure_cache.draw_and_encode(draw, inputs))
+
+
+def send_vega_lite(inputs, draw, spec):
+    data, chart_spec = spec(*inputs)
+    proto = ArrowVegaLiteChart()
+    arrow_vega_lite.marshall(proto, data, chart_spec, use_container_width=True)
+    return proto.ByteSize()
+
+
+def measure(send, inputs, draw, spec, repeat):
+    """Smallest process time over the repeats, and the bytes sent."""
+    cpu = []
+    for _ in range(repeat):
+        start = time.process_time()
+        size = send(inputs, draw, spec)
+        cpu.append(time.process_time() - start)
+    return min(cpu), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', nargs='+', default=PAGES, choices=PAGES)
+    parser.add_argument('--repeat', type=int, default=3, help='number of times each chart is produced')
+    parser.add_argument('--json', help='file where the results are written')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings('ignore')
+    senders = {'matplotlib': send_matplotlib, 'vega-lite': send_vega_lite}
+    results = []
+    for page in args.pages:
+        for chart_id, inputs, draw, spec in record_charts(page):
+            result = {'page': page, 'chart': chart_id}
+            for backend in BACKENDS:
+                cpu, size = measure(senders[backend], inputs, draw, spec, args.repeat)
+                result[backend] = {'cpu': cpu, 'bytes': size}
+            results.append(result)
+            print('{:20} {:30} matplotlib {:7.1f} ms {:8d} B   vega-lite {:7.1f} ms {:8d} B'.format(
+                page, chart_id, result['matplotlib']['cpu']*1000, result['matplotlib']['bytes'],
+                result['vega-lite']['cpu']*1000, result['vega-lite']['bytes']))
+    for backend in BACKENDS:
+        print('total {:10} {:8.3f} s cpu {:10d} B'.format(backend, sum(result[backend]['cpu'] for result in results),
+                                                           sum(result[backend]['bytes'] for result in results)))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Cost of a rerun of the home page when the sidebar sliders move.
+
+Sweeps the age and number of members sliders over a grid of ranges and, for
+each selection, computes the counts of the home page charts in two ways:
+    frame  masks and counts the deputies frame, as the page did before the demographic cube
+    cube   slices and sums the demographic cube (apps.home.get_home_counts)
+Both give the same counts, which is checked for every selection. Only the
+counts are measured, the charts themselves go through the figure cache.
+
+Usage (from the root of the repository):
+    python benchmarks/home_sliders.py --steps 8 --json home_sliders.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregates import get_demographic_cube  # noqa: E402
+from apps.home import get_home_counts  # noqa: E402
+from data_store import get_data_deputies  # noqa: E402
+
+
+def get_frame_counts(df_deputies, pol_party_selected, sex_selected, age_selected, nb_members_selected):
+    """Counts of the charts computed by masking the deputies frame, as the page did before the cube."""
+    mask_pol_parties = df_deputies['pol party'].isin(pol_party_selected)
+    mask_sex = df_deputies['sex'].isin(sex_selected)
+    mask_age = df_deputies['age'].between(age_selected[0], age_selected[1])
+    mask_nb_members = df_deputies['pol party'].value_counts().between(
+        nb_members_selected[0], nb_members_selected[1]).to_frame()
+    mask_nb_members = mask_nb_members[mask_nb_members['pol party'] == 1].index.to_list()
+    mask_nb_members = df_deputies['pol party'].isin(mask_nb_members)
+
+    df_deputies_selected = df_deputies[mask_pol_parties & mask_sex & mask_age & mask_nb_members]
+    party_counts = df_deputies_selected['pol party'].value_counts()
+    party_counts = party_counts[party_counts > 0]
+    party_counts.index = party_counts.index.astype(str)
+
+    df_age = df_deputies_selected['age'].value_counts().sort_index()
+
+    df_sex = df_deputies.loc[mask_pol_parties & mask_nb_members, ['pol party', 'sex']]
+    df_sex = pd.concat([df_sex, pd.get_dummies(df_sex['sex'], prefix='sex')], axis=1)
+    df_sex = df_sex.groupby(['pol party'], observed=True).agg({'sex_female': 'sum', 'sex_male': 'sum'})
+
+    activity_counts = df_deputies_selected['activity'].value_counts()
+    activity_counts = activity_counts[activity_counts > 0]
+    activity_counts.index = activity_counts.index.astype(str)
+    return {'party': party_counts, 'age': df_age, 'sex': df_sex, 'activity': activity_counts}
+
+
+def same_counts(frame, cube):
+    # the page sorts the parties of the women chart by name, their order here does not matter
+    age = cube['age'].set_index('age')['count']
+    frame['sex'] = frame['sex'].set_index(frame['sex'].index.astype(str)).sort_index()
+    return (frame['party'].to_dict() == cube['party'].to_dict() and
+            list(frame['party'].index) == list(cube['party'].index) and
+            frame['age'].to_dict() == age.to_dict() and
+            np.array_equal(frame['sex'].to_numpy(int), cube['sex'].to_numpy(int)) and
+            list(frame['sex'].index) == list(cube['sex'].index) and
+            frame['activity'].to_dict() == cube['activity'].to_dict())
+
+
+def get_selections(df_deputies, steps):
+    """Every (age range, number of members range) of a grid of steps values per slider end."""
+    parties = df_deputies['pol party'].unique().tolist()
+    members = df_deputies['pol party'].value_counts()
+    ages = np.unique(np.linspace(df_deputies['age'].min(), df_deputies['age'].max(), steps).astype(int))
+    sizes = np.unique(np.linspace(members.min(), members.max(), steps).astype(int))
+    return [(parties, ['female', 'male'], (int(age_min), int(age_max)), (int(size_min), int(size_max)))
+            for age_min in ages for age_max in ages if age_min <= age_max
+            for size_min in sizes for size_max in sizes if size_min <= size_max]
+
+
+def measure(compute, selections):
+    latencies = []
+    for selection in selections:
+        start = time.perf_counter()
+        compute(*selection)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legislature', default='15')
+    parser.add_argument('--steps', type=int, default=8, help='number of values of each end of the sliders')
+    parser.add_argument('--json', help='file where the results are written')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings('ignore')
+    df_deputies = get_data_deputies(args.legislature)
+    start = time.perf_counter()
+    cube = get_demographic_cube(args.legislature)
+    build = time.perf_counter() - start
+    selections = get_selections(df_deputies, args.steps)
+
+    mismatches = [selection for selection in selections
+                  if not same_counts(get_frame_counts(df_deputies, *selection), get_home_counts(cube, *selection))]
+    results = {'legislature': args.legislature, 'selections': len(selections), 'mismatches': len(mismatches),
+               'cube build': build, 'cube bytes': int(cube.counts.nbytes)}
+    print('{} selections, {} mismatches, cube of {} bytes built in {:.3f} s'.format(
+        len(selections), len(mismatches), cube.counts.nbytes, build))
+    for name, compute in [('frame', lambda *selection: get_frame_counts(df_deputies, *selection)),
+                          ('cube', lambda *selection: get_home_counts(cube, *selection))]:
+        latencies = measure(compute, selections)
+        results[name] = {'p50': float(np.percentile(latencies, 50)), 'p95': float(np.percentile(latencies, 95)),
+                         'total': float(np.sum(latencies))}
+        print('{:6} p50 {:7.2f} ms  p95 {:7.2f} ms  total {:7.3f} s'.format(
+            name, results[name]['p50']*1000, results[name]['p95']*1000, results[name]['total']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
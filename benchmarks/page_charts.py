@@ -0,0 +1,22 @@
+"""Pages of the app and the charts they display, shared by the benchmarks.
+
+The pages are run once without Streamlit server, their widgets return their
+default values, and the charts they pass to st_figure are recorded instead of
+being displayed.
+"""
+import importlib
+
+PAGES = ['home', 'parties_comparator', 'vote_summary', 'deputies']
+
+
+def record_charts(page):
+    """Runs the page once without Streamlit server and returns the (chart id, inputs, draw, spec) of its charts."""
+    module = importlib.import_module('apps.' + page)
+    charts = []
+    display = module.st_figure
+    module.st_figure = lambda chart_id, inputs, draw, spec=None: charts.append((chart_id, inputs, draw, spec))
+    try:
+        module.app()
+    finally:
+        module.st_figure = display
+    return charts
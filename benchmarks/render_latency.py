@@ -0,0 +1,81 @@
+"""Page latency of the chart rendering under concurrent sessions.
+
+The charts of the pages are recorded once (chart id, inputs and draw
+function), then N sessions render the charts of a page at the same time, each
+session in its own thread as in the Streamlit server. The figure cache is not
+used, every chart is drawn, so the numbers are the cost of a cold page.
+Two modes are compared:
+    lock       every chart is drawn under one global lock, like the pages did with RendererAgg.lock
+    threads    the charts are drawn in the session threads without lock
+
+Usage (from the root of the repository):
+    python benchmarks/render_latency.py --sessions 1 8 32 --json latency.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import figure_cache  # noqa: E402
+from page_charts import PAGES, record_charts  # noqa: E402
+
+MODES = ['lock', 'threads']
+
+
+def render_page(charts, mode, lock):
+    start = time.perf_counter()
+    for chart_id, inputs, draw, spec in charts:
+        if mode == 'lock':
+            with lock:
+                figure_cache.draw_and_encode(draw, inputs)
+        else:
+            figure_cache.draw_and_encode(draw, inputs)
+    return time.perf_counter() - start
+
+
+def run(charts, mode, sessions, repeat):
+    """Latencies of the pages rendered by the sessions, each session renders the page repeat times."""
+    lock = threading.Lock()
+    with ThreadPoolExecutor(sessions) as executor:
+        futures = [executor.submit(render_page, charts, mode, lock) for _ in range(sessions*repeat)]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--pages', nargs='+', default=PAGES, choices=PAGES)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--repeat', type=int, default=1, help='number of page renders per session')
+    parser.add_argument('--json', help='file where the results are written')
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings('ignore')
+    results = []
+    for page in args.pages:
+        charts = record_charts(page)
+        for mode in args.modes:
+            for sessions in args.sessions:
+                latencies = run(charts, mode, sessions, args.repeat)
+                result = {'page': page, 'charts': len(charts), 'mode': mode, 'sessions': sessions,
+                          'p50': float(np.percentile(latencies, 50)), 'p95': float(np.percentile(latencies, 95))}
+                results.append(result)
+                print('{page:20} {charts:3} charts {mode:10} {sessions:3} sessions  '
+                      'p50 {p50:7.3f} s  p95 {p95:7.3f} s'.format(**result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'cpus': os.cpu_count(), 'results': results}, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""Timings of the loaders, the aggregates and the pages on synthetic data larger than the real one.
+
+For each scale, a synthetic legislature is generated from a real one of the
+data folder, then measured in a separate process with empty caches:
+    loaders     each get_data_* loader of data_store.DATASETS, and read_vote_total
+    aggregates  the aggregates computed by each page (vote matrix, cube, indexes, calendars...), and the per-rerun
+                lookups the pages do on them
+    pages       a cold run (empty caches) and warm reruns of home, parties_comparator, vote_summary and deputies,
+                each page run without a Streamlit server (its widgets return their default values)
+The cached aggregates are measured in order, each one only pays for itself,
+the aggregates it is built from being already in the cache.
+
+The synthetic legislature has the number of deputies and parties of the real
+one: the assembly has a fixed number of seats, what grows is the number of
+scrutins, of nominative votes, of organs and of memberships, which are scaled.
+    df_dep, df_polpar              the real deputies under new codes, dates of birth and activities shuffled
+    df_organs                      scale copies of the real organs
+    df_deputies_in_organs          the memberships of each deputy to every copy of its organs
+    df_vote_descr, df_vote_total   scale copies of each scrutin on the same day, every deputy voting with the
+                                   probability given by the real number of voters, most of them with the position
+                                   of their party
+At 50x the legislature has about 200 000 scrutins and 20 million nominative
+votes, measuring it takes about 4 GB of memory.
+
+Usage (from the root of the repository):
+    python benchmarks/scale_suite.py --scales 1 10 50 --json scale_suite.json
+    python benchmarks/scale_suite.py --scales 10 --keep synthetic --csv   # keep the generated data folders
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_store import get_data_path, get_vote_years, save_vote_total_snapshot  # noqa: E402
+from etl import write_legislature_info  # noqa: E402
+from page_charts import PAGES  # noqa: E402
+
+# share of the deputies voting with the position of their party, and of the votes cast by delegation
+PARTY_DISCIPLINE = 0.9
+DELEGATION_RATE = 0.05
+# number of scrutins whose nominative votes are drawn at once
+CHUNK = 2000
+
+
+###
+# Generator
+
+
+def copy_codes(codes, copy):
+    # the first copy keeps the real codes
+    codes = pd.Series(codes, dtype=str)
+    return codes if copy == 0 else codes + '_' + str(copy)
+
+
+def generate_deputies(df_dep, rng):
+    """Real deputies under new codes, with their dates of birth and activities shuffled."""
+    df = df_dep.copy()
+    df['code'] = ['PA{}'.format(900000 + i) for i in range(len(df.index))]
+    for column in ['date of birth', 'activity']:
+        df[column] = rng.permutation(df[column].to_numpy())
+    return df
+
+
+def generate_organs(df_organs, df_deputies_in_organs, codes, scale):
+    """Scale copies of the organs, each deputy belonging to the copies of its organs.
+    codes maps the real deputy codes to the synthetic ones.
+    """
+    organs = []
+    memberships = []
+    for copy in range(scale):
+        df = df_organs.copy()
+        df['code'] = copy_codes(df_organs['code'], copy).to_numpy()
+        if copy > 0:
+            df['name'] = df['name'] + ' ({})'.format(copy)
+        organs.append(df)
+        memberships.append(pd.DataFrame({
+            'code_organe': copy_codes(df_deputies_in_organs['code_organe'], copy).to_numpy(),
+            'code_deputy': df_deputies_in_organs['code_deputy'].map(codes).to_numpy()}))
+    return pd.concat(organs, ignore_index=True), pd.concat(memberships, ignore_index=True).dropna()
+
+
+def generate_votes(df_vote_descr, df_dep, scale, rng):
+    """Scale copies of the scrutins with their nominative votes.
+    Returns the description of the scrutins, whose counts are the ones of the generated votes, and the arrays of the
+    vote table: scrutin and deputy of each vote, its position (0 pour, 1 contre, 2 abstention) and delegation flag.
+    """
+    df = pd.concat([df_vote_descr.assign(code=copy_codes(df_vote_descr['code'], copy).to_numpy())
+                    for copy in range(scale)], ignore_index=True)
+    party = df_dep['pol party'].astype('category').cat.codes.to_numpy()
+    nb_parties = party.max() + 1
+    presence = np.clip(df['nb votants'].to_numpy()/len(df_dep.index), 0, 1)
+
+    scrutins, deputies, positions = [], [], []
+    for start in range(0, len(df.index), CHUNK):
+        chunk = presence[start:start + CHUNK]
+        present = rng.random((len(chunk), len(party))) < chunk[:, None]
+        lines = rng.integers(0, 3, (len(chunk), nb_parties))
+        position = np.where(rng.random(present.shape) < PARTY_DISCIPLINE, lines[:, party],
+                            rng.integers(0, 3, present.shape)).astype(np.int8)
+        rows, columns = np.nonzero(present)
+        scrutins.append((rows + start).astype(np.int32))
+        deputies.append(columns.astype(np.int16))
+        positions.append(position[rows, columns])
+    scrutins, deputies, positions = np.concatenate(scrutins), np.concatenate(deputies), np.concatenate(positions)
+    delegation = rng.random(len(scrutins)) < DELEGATION_RATE
+
+    counts = np.zeros((len(df.index), 3), dtype=int)
+    np.add.at(counts, (scrutins, positions), 1)
+    df['pour'], df['contre'], df['abstentions'] = counts[:, 0], counts[:, 1], counts[:, 2]
+    df['nb votants'] = counts.sum(axis=1)
+    return df, scrutins, deputies, positions, delegation
+
+
+def generate(source, folder, scale, seed=0, csv=False):
+    """Writes in folder/data/<legislature> a synthetic legislature scale times larger than the source one.
+    Returns the number of rows of each table.
+    """
+    rng = np.random.default_rng(seed)
+    legislature = os.path.basename(source)
+    destination = os.path.join(folder, 'data', legislature)
+    os.makedirs(destination, exist_ok=True)
+
+    df_dep = pd.read_csv(os.path.join(source, 'df_dep.csv'), dtype={'num_dep': str})
+    df_dep_synthetic = generate_deputies(df_dep, rng)
+    df_dep_synthetic.to_csv(os.path.join(destination, 'df_dep.csv'), index=False)
+    shutil.copy(os.path.join(source, 'df_polpar.csv'), destination)
+    df_organs, df_deputies_in_organs = generate_organs(
+        pd.read_csv(os.path.join(source, 'df_organs.csv')),
+        pd.read_csv(os.path.join(source, 'df_deputies_in_organs.csv')),
+        pd.Series(df_dep_synthetic['code'].to_numpy(), index=df_dep['code']), scale)
+    df_organs.to_csv(os.path.join(destination, 'df_organs.csv'), index=False)
+    df_deputies_in_organs.to_csv(os.path.join(destination, 'df_deputies_in_organs.csv'), index=False)
+    sizes = {'deputies': len(df_dep.index), 'organs': len(df_organs.index),
+             'deputies in organs': len(df_deputies_in_organs.index), 'scrutins': 0, 'nominative votes': 0}
+
+    for year in sorted(os.listdir(os.path.join(source, 'votes'))):
+        partition = os.path.join(destination, 'votes', year)
+        os.makedirs(partition)
+        df_vote_descr, scrutins, deputies, positions, delegation = generate_votes(
+            pd.read_csv(os.path.join(source, 'votes', year, 'df_vote_descr.csv')), df_dep_synthetic, scale, rng)
+        df_vote_descr.to_csv(os.path.join(partition, 'df_vote_descr.csv'), index=False)
+        df_vote_total = pd.DataFrame({
+            'scrutin': pd.Categorical.from_codes(scrutins, df_vote_descr['code']),
+            'deputy code': pd.Categorical.from_codes(deputies, df_dep_synthetic['code']),
+            'pour': positions == 0, 'contre': positions == 1, 'abstentions': positions == 2,
+            'par delegation': delegation})
+        save_vote_total_snapshot(df_vote_total, os.path.join(partition, 'df_vote_total.npz'))
+        if csv:
+            df_vote_total.to_csv(os.path.join(partition, 'df_vote_total.csv'), index=False)
+        sizes['scrutins'] += len(df_vote_descr.index)
+        sizes['nominative votes'] += len(df_vote_total.index)
+    write_legislature_info(destination, legislature)
+    return sizes
+
+
+###
+# Measures, run in the folder of the synthetic data
+
+
+def clear_caches():
+    from figure_cache import get_figure_cache
+    from resource_cache import clear_caches as clear_resource_caches
+    clear_resource_caches()
+    get_figure_cache().clear()
+
+
+def timed(function, repeat=1):
+    """Median duration of the calls of the function."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations))
+
+
+def measure_loaders(legislature):
+    from data_store import DATASETS, load_vote_total_csv, read_vote_total
+
+    results = {name: timed(lambda: loader(legislature)) for name, loader in DATASETS.items()}
+    results['vote total'] = timed(lambda: read_vote_total(legislature))
+    csv_paths = [get_data_path('df_vote_total.csv', legislature, year) for year in get_vote_years(legislature)]
+    if all(os.path.exists(path) for path in csv_paths):
+        results['vote total csv'] = timed(lambda: [load_vote_total_csv(path) for path in csv_paths])
+    return results
+
+
+def get_aggregate_blocks(legislature):
+    """(page, block, function, rerun) of the aggregates of every page, in the order they are built.
+    The cached blocks are measured once, the rerun blocks, computed on every rerun of the page, several times.
+    """
+    import aggregates
+    import indexes
+    from apps.home import get_home_counts
+    from data_store import get_data_deputies
+
+    df_dep = get_data_deputies(legislature)
+    code = df_dep['code'][0]
+    party = str(df_dep['pol party'][0])
+    years = get_vote_years(legislature)
+    return [
+        ('all', 'vote matrix', lambda: aggregates.get_vote_matrix(legislature), False),
+        ('home', 'demographic cube', lambda: aggregates.get_demographic_cube(legislature), False),
+        ('home', 'home counts', lambda: get_home_counts(
+            aggregates.get_demographic_cube(legislature), df_dep['pol party'].unique().tolist(), ['female', 'male'],
+            (df_dep['age'].min(), df_dep['age'].max()), (0, len(df_dep.index))), True),
+        ('parties_comparator', 'deputy vote totals', lambda: aggregates.get_deputy_vote_totals(legislature), False),
+        ('parties_comparator', 'party vote totals', lambda: aggregates.get_party_vote_totals(legislature), False),
+        ('parties_comparator', 'party vote ratios', lambda: aggregates.get_party_vote_ratios(legislature), False),
+        ('parties_comparator', 'party positions', lambda: aggregates.get_party_positions(legislature), False),
+        ('parties_comparator', 'party cohesion', lambda: aggregates.get_party_cohesion(legislature), False),
+        ('parties_comparator', 'party agreement', lambda: aggregates.get_party_agreement(legislature), False),
+        ('vote_summary', 'vote calendars', lambda: [aggregates.get_vote_calendar(legislature, year)
+                                                    for year in years], False),
+        ('vote_summary', 'vote calendar grid', lambda: aggregates.get_vote_calendar(legislature, years[-1]).grid(
+            'presence', (0, len(df_dep.index))), True),
+        ('vote_summary', 'scrutin index', lambda: indexes.get_scrutin_index(legislature), False),
+        ('vote_summary', 'scrutin search', lambda: indexes.get_scrutin_index(legislature).search(
+            "amendement de l'article"), True),
+        ('deputies', 'deputy index', lambda: indexes.get_deputy_index(legislature), False),
+        ('deputies', 'deputy selection', lambda: indexes.get_deputy_index(legislature).select(
+            parties=[party], sexes=['female', 'male']), True),
+        ('deputies', 'deputy search', lambda: indexes.get_deputy_index(legislature).search('mar'), True),
+        ('deputies', 'deputy neighbours', lambda: aggregates.get_deputy_neighbours(legislature), False),
+        ('deputies', 'deputy map', lambda: aggregates.get_deputy_map(legislature), False),
+        ('deputies', 'closest deputies', lambda: aggregates.get_deputy_neighbours(legislature).closest(code), True),
+        ('deputies', 'participation series', lambda: aggregates.get_participation_series(legislature), False),
+        ('deputies', 'participation monthly', lambda: aggregates.get_participation_series(legislature).monthly(
+            deputy=code), True),
+    ]
+
+
+def measure_aggregates(legislature, repeat):
+    return [{'page': page, 'block': block, 'rerun': rerun, 'seconds': timed(function, repeat if rerun else 1)}
+            for page, block, function, rerun in get_aggregate_blocks(legislature)]
+
+
+def run_page(page):
+    """Runs a page once like app.py does, its datasets loaded first, returns its duration."""
+    from data_store import get_selected_legislature, load_datasets
+
+    start = time.perf_counter()
+    load_datasets(getattr(page, 'DATASETS', []), get_selected_legislature())
+    page.app()
+    return time.perf_counter() - start
+
+
+def measure_pages(pages, repeat):
+    """Duration of a cold run (empty caches) and median duration of the warm reruns of each page."""
+    results = {}
+    for name in pages:
+        page = importlib.import_module('apps.' + name)
+        clear_caches()
+        cold = run_page(page)
+        warm = [run_page(page) for _ in range(repeat)]
+        results[name] = {'cold': cold, 'warm': float(np.median(warm))}
+    return results
+
+
+def measure(legislature, pages, repeat):
+    """Timings of the data folder of the working directory."""
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings('ignore')
+    results = {'loaders': measure_loaders(legislature), 'aggregates': measure_aggregates(legislature, repeat),
+               'pages': measure_pages(pages, repeat)}
+    # kilobytes on linux
+    results['peak memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+    return results
+
+
+###
+# Report
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(result):
+    sizes = result['sizes']
+    print('scale {}: {} scrutins, {} nominative votes, {} organs, generated in {:.1f} s'.format(
+        result['scale'], sizes['scrutins'], sizes['nominative votes'], sizes['organs'], result['generate']))
+    for name, seconds in result['loaders'].items():
+        print('    loader     {:32} {:9.3f} s'.format(name, seconds))
+    for block in result['aggregates']:
+        print('    aggregate  {:32} {:9.3f} s  ({})'.format(block['block'], block['seconds'], block['page']))
+    for page, timings in result['pages'].items():
+        print('    page       {:32} cold {:7.3f} s  warm {:7.3f} s'.format(page, timings['cold'], timings['warm']))
+    print('    peak memory {:.0f} MB'.format(result['peak memory']/2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--legislature', default='15', help='real legislature the synthetic data is generated from')
+    parser.add_argument('--pages', nargs='+', default=PAGES, choices=PAGES)
+    parser.add_argument('--repeat', type=int, default=3, help='number of measures of the reruns')
+    parser.add_argument('--csv', action='store_true', help='also write the csv of the nominative votes and time it')
+    parser.add_argument('--keep', help='folder where the generated data is kept, a temporary folder by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='file where the results are written')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        # measures of one scale, in their own process so that the caches and the memory start empty
+        os.chdir(args.measure)
+        with open('results.json', 'w', encoding='utf-8') as f:
+            json.dump(measure(args.legislature, args.pages, args.repeat), f)
+        return 0
+
+    report = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': get_commit(), 'cpus': os.cpu_count(),
+              'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+              'legislature': args.legislature, 'results': []}
+    folder = args.keep or tempfile.mkdtemp(prefix='scale_suite_')
+    try:
+        for scale in args.scales:
+            scale_folder = os.path.join(folder, 'scale_{}'.format(scale))
+            shutil.rmtree(scale_folder, ignore_errors=True)
+            start = time.perf_counter()
+            sizes = generate(get_data_path('', args.legislature).rstrip(os.sep), scale_folder, scale, args.seed,
+                             args.csv)
+            result = {'scale': scale, 'sizes': sizes, 'generate': time.perf_counter() - start}
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', scale_folder,
+                            '--legislature', args.legislature, '--repeat', str(args.repeat), '--pages'] + args.pages,
+                           check=True)
+            with open(os.path.join(scale_folder, 'results.json'), encoding='utf-8') as f:
+                result.update(json.load(f))
+            report['results'].append(result)
+            print_results(result)
+    finally:
+        if not args.keep:
+            shutil.rmtree(folder, ignore_errors=True)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Charts drawn by the browser from their aggregated data.
+
+With the environment variable CHART_BACKEND set to 'vega-lite', the pages
+do not draw their charts with matplotlib: each chart is sent as its data (a
+few counts per party, the bins of a histogram, the 12 x 31 grid of the
+heatmap...) along with a Vega-Lite spec, and rendered by the browser.
+The server then does not rasterize anything and the payload of a chart is a
+few hundred bytes instead of a PNG.
+
+Every builder returns the data and the spec given to st.vega_lite_chart, the
+pages wrap them in spec_* functions taking the same inputs as their draw_*
+functions.
+"""
+import numpy as np
+import pandas as pd
+from matplotlib.colors import to_hex
+
+# matplotlib default color cycle
+DEFAULT_SCHEME = 'category10'
+
+
+def _color_scale(labels, colors):
+    if colors is None:
+        return {'scheme': DEFAULT_SCHEME}
+    return {'domain': list(labels), 'range': [to_hex(color) for color in colors]}
+
+
+def donut(labels, values, colors=None, text=None, legend=True):
+    """Donut of the values, with an optional text at its center."""
+    data = pd.DataFrame({'label': [str(label) for label in labels], 'value': np.asarray(values, dtype=float)})
+    data['order'] = np.arange(len(data.index))
+    arc = {
+        'mark': {'type': 'arc', 'innerRadius': 70, 'stroke': 'white', 'strokeWidth': 4},
+        'encoding': {
+            'theta': {'field': 'value', 'type': 'quantitative', 'stack': True},
+            'order': {'field': 'order', 'type': 'ordinal'},
+            'color': {'field': 'label', 'type': 'nominal', 'sort': None, 'title': None,
+                      'scale': _color_scale(data['label'], colors), **({} if legend else {'legend': None})},
+            'tooltip': [{'field': 'label', 'type': 'nominal'}, {'field': 'value', 'type': 'quantitative'}]
+        }
+    }
+    spec = {'view': {'stroke': None}, 'layer': [arc]}
+    if text is not None:
+        spec['layer'].append({'data': {'values': [{}]},
+                              'mark': {'type': 'text', 'text': str(text).split('\n'), 'fontSize': 20}})
+    return data, spec
+
+
+def histogram(values, bins, stat='count', hue=None, weights=None, xlabel=None):
+    """Histogram binned here like seaborn does (bins evenly spaced between the min and max values), the browser
+    only draws the bars. With a hue, the histograms of each value of the hue are overlaid.
+    """
+    values = np.asarray(values, dtype=float)
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float)
+    edges = np.histogram_bin_edges(values, bins=bins) if len(values) else np.arange(bins + 1, dtype=float)
+    groups = [(None, np.ones(len(values), dtype=bool))] if hue is None else \
+        [(str(level), np.asarray(hue) == level) for level in pd.unique(hue)]
+    frames = []
+    for level, mask in groups:
+        counts, _ = np.histogram(values[mask], bins=edges, weights=weights[mask])
+        if stat == 'probability' and weights.sum() > 0:
+            counts = counts/weights.sum()
+        frames.append(pd.DataFrame({'start': edges[:-1], 'end': edges[1:], 'value': counts, 'hue': level}))
+    data = pd.concat(frames, ignore_index=True)
+    encoding = {
+        'x': {'field': 'start', 'type': 'quantitative', 'title': xlabel, 'bin': {'binned': True}},
+        'x2': {'field': 'end'},
+        'y': {'field': 'value', 'type': 'quantitative', 'stack': None, 'title': stat.capitalize()}
+    }
+    if hue is not None:
+        encoding['color'] = {'field': 'hue', 'type': 'nominal', 'scale': {'scheme': DEFAULT_SCHEME}}
+    return data, {'mark': {'type': 'bar', 'opacity': 0.6 if hue is not None else 1}, 'encoding': encoding}
+
+
+def barplot(labels, values, colors, xlabel=None, ylabel=None, texts=None):
+    """Horizontal bars, one per label in the given order, with an optional text written in each bar."""
+    data = pd.DataFrame({'label': [str(label) for label in labels], 'value': np.asarray(values, dtype=float),
+                         'color': [to_hex(color) for color in colors]})
+    data['text'] = [''] * len(data.index) if texts is None else [str(text) for text in texts]
+    encoding = {
+        'y': {'field': 'label', 'type': 'nominal', 'sort': None, 'title': ylabel},
+        'x': {'field': 'value', 'type': 'quantitative', 'title': xlabel}
+    }
+    bars = {'mark': 'bar', 'encoding': dict(encoding, color={'field': 'color', 'type': 'nominal', 'scale': None})}
+    texts = {'mark': {'type': 'text', 'align': 'right', 'dx': -4, 'fontSize': 12},
+             'encoding': dict(encoding, text={'field': 'text'})}
+    return data, {'layer': [bars, texts]}
+
+
+def lines(df, ylabel=None):
+    """One line per column of the dataframe, along its index."""
+    data = df.rename_axis(index='x').reset_index().melt(id_vars='x', var_name='line', value_name='value')
+    x_type = 'temporal' if pd.api.types.is_datetime64_any_dtype(data['x']) else 'quantitative'
+    spec = {
+        'mark': {'type': 'line'},
+        'encoding': {
+            'x': {'field': 'x', 'type': x_type, 'title': None},
+            'y': {'field': 'value', 'type': 'quantitative', 'title': ylabel},
+            'color': {'field': 'line', 'type': 'nominal', 'title': None, 'sort': list(df.columns),
+                      'scale': {'scheme': DEFAULT_SCHEME}}
+        }
+    }
+    return data, spec
+
+
+def scatter(x, y, groups, colors, highlight=None, xlabel=None, ylabel=None):
+    """Points colored by group (colors maps each group to its color), the point at the position highlight circled."""
+    data = pd.DataFrame({'x': np.asarray(x, dtype=float), 'y': np.asarray(y, dtype=float),
+                         'group': [str(group) for group in groups]})
+    data['highlight'] = np.arange(len(data.index)) == (-1 if highlight is None else highlight)
+    domain = sorted(data['group'].unique())
+    encoding = {
+        'x': {'field': 'x', 'type': 'quantitative', 'title': xlabel, 'axis': {'labels': False}},
+        'y': {'field': 'y', 'type': 'quantitative', 'title': ylabel, 'axis': {'labels': False}}
+    }
+    points = {'mark': {'type': 'circle', 'opacity': 0.7},
+              'encoding': dict(encoding, color={'field': 'group', 'type': 'nominal', 'title': None, 'scale': {
+                  'domain': domain, 'range': [to_hex(colors[group]) for group in domain]}})}
+    circle = {'transform': [{'filter': 'datum.highlight'}],
+              'mark': {'type': 'point', 'size': 300, 'color': 'black', 'strokeWidth': 2}, 'encoding': encoding}
+    return data, {'layer': [points, circle]}
+
+
+def heatmap(df, palette, title, xlabel=None, ylabel=None, robust=True):
+    """Heatmap of a dataframe, one cell per index x column, each color of the palette covering an equal part of
+    the color range. Like seaborn with robust=True, the color range goes from the 2nd to the 98th percentile of the
+    values.
+    """
+    values = df.to_numpy(dtype=float)
+    domain = [float(np.nanpercentile(values, 2)), float(np.nanpercentile(values, 98))] if robust else \
+        [float(np.nanmin(values)), float(np.nanmax(values))]
+    if domain[0] == domain[1]:
+        domain[1] = domain[0] + 1
+    data = df.rename_axis(index='row', columns='column').stack().rename('value').reset_index()
+    spec = {
+        'title': title,
+        'mark': {'type': 'rect', 'stroke': '#222', 'strokeWidth': 0.2},
+        'encoding': {
+            'x': {'field': 'column', 'type': 'ordinal', 'title': xlabel},
+            'y': {'field': 'row', 'type': 'ordinal', 'title': ylabel},
+            'color': {'field': 'value', 'type': 'quantitative', 'title': None,
+                      'scale': {'type': 'quantize', 'domain': domain, 'range': [to_hex(color) for color in palette]}},
+            'tooltip': [{'field': 'row'}, {'field': 'column'}, {'field': 'value'}]
+        }
+    }
+    return data, spec
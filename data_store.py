@@ -0,0 +1,406 @@
+"""Shared data access layer for all the pages of the app.
+
+Each dataset is parsed once per process into a canonical typed dataframe and
+kept by resource_cache.cache_resource, so every page, every session and the
+JSON API work on the same copy instead of holding their own pickled version.
+The datasets of a legislature are read again once the ETL has rewritten them
+(see get_data_version).
+The frames returned by the loaders are shared: pages must treat them as
+read-only and derive what they need (column selection, masks, groupby)
+without modifying them in place.
+
+The data folder is partitioned by legislature, and by year for the votes:
+    data/<legislature>/df_dep.csv, df_polpar.csv, df_organs.csv, df_deputies_in_organs.csv, legislature.json
+    data/<legislature>/votes/<year>/df_vote_descr.csv, df_vote_total.csv, df_vote_total.npz
+    data/pictures/<deputy code>.jpg, portraits.bin, portraits.json
+Loaders take the legislature (and the years for the votes) as arguments, a
+partition is only read the first time a page asks for it.
+"""
+import io
+import json
+import mmap
+import os
+import re
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pandas.api.types import union_categoricals
+
+from resource_cache import cache_resource
+
+
+def get_data_path(file_name, legislature=None, year=None):
+    path = os.path.join(os.getcwd(), 'data')
+    if legislature is not None:
+        path = os.path.join(path, str(legislature))
+    if year is not None:
+        path = os.path.join(path, 'votes', str(year))
+    return os.path.join(path, file_name)
+
+
+###
+# Partitions
+
+
+def get_legislatures():
+    """Numbers of the legislatures available in the data folder, in increasing order."""
+    return sorted([name for name in os.listdir(get_data_path('')) if name.isdigit()], key=int)
+
+
+def get_vote_years(legislature):
+    """Years of the vote partitions of a legislature, in increasing order."""
+    path = get_data_path('votes', legislature)
+    if not os.path.isdir(path):
+        return []
+    return sorted([name for name in os.listdir(path) if name.isdigit()])
+
+
+def get_data_version(legislature, *args, **kwargs):
+    """Version of the data of a legislature, the modification time of legislature.json.
+    Every run of the ETL, full or incremental, writes legislature.json after the tables. The cached datasets and
+    aggregates computed from an older version are computed again.
+    """
+    try:
+        return os.stat(get_data_path('legislature.json', legislature)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_selected_legislature():
+    """Legislature selected in the sidebar of the app, the most recent one by default."""
+    return st.session_state.get('legislature', get_legislatures()[-1])
+
+
+@cache_resource('load', version=get_data_version)
+def get_legislature_info(legislature):
+    """Description of a legislature written by the ETL ('first vote' and 'last vote' dates)."""
+    with open(get_data_path('legislature.json', legislature), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def to_roman(number):
+    number = int(number)
+    text = ''
+    for value, numeral in [(1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+                           (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')]:
+        while number >= value:
+            text = text + numeral
+            number = number - value
+    return text
+
+
+###
+# Datasets of a legislature
+
+
+@cache_resource('load', version=get_data_version)
+def get_data_deputies(legislature):
+    """Deputies of the assembly, one row per deputy.
+    Besides the columns of df_dep.csv, the frame holds the precomputed 'age',
+    'full_name', 'title' and 'departement' (name and number of the
+    departement). 'departement' is a categorical whose categories are sorted
+    by departement number.
+    """
+    df = pd.read_csv(get_data_path('df_dep.csv', legislature), dtype={'num_dep': str})
+    df['date of birth'] = pd.to_datetime(df['date of birth'], format='%Y-%m-%d')
+    # create the value age from the date of birth of the deputies
+    df['age'] = (date.today().year - df['date of birth'].dt.year).astype('int16')
+    df['full_name'] = df['first name'] + ' ' + df['family name']
+    df['title'] = 'Mr.'
+    df.loc[df['sex'] == 'female', 'title'] = 'Mme.'
+
+    df['departement'] = df['dep'] + ' (' + df['num_dep'] + ')'
+    departements = df.sort_values(by=['num_dep'])['departement'].unique()
+    df['departement'] = pd.Categorical(df['departement'], categories=departements)
+    for column in ['sex', 'activity', 'pol party', 'dep']:
+        df[column] = df[column].astype('category')
+    return df
+
+
+@cache_resource('load', version=get_data_version)
+def get_data_political_parties(legislature):
+    """Political parties with their number of members and display color."""
+    return pd.read_csv(get_data_path('df_polpar.csv', legislature))
+
+
+@cache_resource('load', version=get_data_version)
+def get_data_votes_partition(legislature, year):
+    """Description of the scrutins of one year, one row per scrutin.
+    The 'demandeur XXX' flags are renamed to the party abbreviation and the
+    date is stored as a real 'datetime' along with integer year, month and day.
+    """
+    df = pd.read_csv(get_data_path('df_vote_descr.csv', legislature, year))
+    datetime = pd.to_datetime(df['date'], format='%Y-%m-%d', errors='coerce')
+    df['type'] = df['type'].astype('category')
+    df['year'] = datetime.dt.year.astype('int16')
+    df['month'] = datetime.dt.month.astype('int8')
+    df['day'] = datetime.dt.day.astype('int8')
+    df['datetime'] = datetime
+    df['percentage of votes in favor'] = 100*df['pour']/df['nb votants']
+    df['accepted'] = 'no'
+    df.loc[df['pour'] >= df['requis'], 'accepted'] = 'yes'
+    df = df.drop(columns=['date'])
+    df.columns = df.columns.str.replace('demandeur ', '')
+    return df
+
+
+def get_data_votes(legislature, years=None):
+    """Description of the scrutins of the selected years (all the years by default).
+    Only the partitions of the selected years are loaded. The partitions are cached, their concatenation is not, it
+    would hold the scrutins in memory a second time.
+    """
+    if not years:
+        years = get_vote_years(legislature)
+    partitions = [get_data_votes_partition(legislature, year) for year in sorted(years)]
+    if len(partitions) == 1:
+        return partitions[0]
+    df = pd.concat(partitions, ignore_index=True)
+    df['type'] = df['type'].astype('category')
+    return df
+
+
+###
+# Requesters of the scrutins
+# The 'demandeur' text names the groups which requested a scrutin. The text is folded (no accents, lower case) and
+# every spelling of every group is matched in a single pass of one compiled pattern, which gives one row per scrutin
+# and requesting group. Adding a group or a spelling only changes REQUESTERS.
+
+REQUESTERS = {
+    'REP': ["Les Républicains"],
+    'LAREM': ["La République en Marche"],
+    'FI': ["La France insoumise"],
+    'PS': ["Nouvelle Gauche", "Socialistes et apparentés"],
+    'MODEM': ["Mouvement Démocrate"],
+    'RPS': ["Libertés et Territoires"],
+    'UDRL': ["UDI", "Agir Ensemble"],
+    'PCF': ["Gauche démocrate"],
+    'CDP': ["Conférence des Présidents"],
+    'GOV': ["Gouvernement"],
+    'COM SPE': ["Commission"]
+}
+
+
+def fold_texts(texts):
+    """Texts without accents and in lower case, 'Conférence des Présidents' -> 'conference des presidents'."""
+    return texts.fillna('').str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.lower()
+
+
+def make_requester_pattern(requesters):
+    # one named group per requester (g0, g1... in the order of requesters), matching any of its spellings
+    alternatives = ['(?P<g{}>{})'.format(i, '|'.join(re.escape(spelling) for spelling in fold_texts(
+        pd.Series(spellings)))) for i, spellings in enumerate(requesters.values())]
+    return re.compile(r'\b(?:' + '|'.join(alternatives) + ')')
+
+
+REQUESTER_PATTERN = make_requester_pattern(REQUESTERS)
+
+
+def get_vote_requesters(df_vote_descr):
+    """Long table of the requesters, one row ('code', 'requester') per scrutin and group which requested it."""
+    # the same few hundred texts come back on every scrutin, each distinct text is matched once
+    texts, distinct_texts = pd.factorize(df_vote_descr['demandeur'].fillna(''))
+    names = list(REQUESTERS)
+    matches = pd.DataFrame([(i, names[int(match.lastgroup[1:])])
+                            for i, text in enumerate(fold_texts(pd.Series(distinct_texts, dtype=object)))
+                            for match in REQUESTER_PATTERN.finditer(text)], columns=['text', 'requester'])
+    df = pd.DataFrame({'code': df_vote_descr['code'].to_numpy(), 'text': texts})
+    df = df.merge(matches.drop_duplicates(), on='text')
+    return df[['code', 'requester']]
+
+
+@cache_resource('load', version=get_data_version)
+def get_data_vote_requesters_partition(legislature, year):
+    return get_vote_requesters(get_data_votes_partition(legislature, year))
+
+
+def get_data_vote_requesters(legislature, years=None):
+    """Requesters of the scrutins of the selected years (all the years by default), see get_vote_requesters."""
+    if not years:
+        years = get_vote_years(legislature)
+    return pd.concat([get_data_vote_requesters_partition(legislature, year) for year in sorted(years)],
+                     ignore_index=True)
+
+
+@cache_resource('load', version=get_data_version)
+def get_data_organs(legislature):
+    """Organs of the assembly (commissions, study groups, parties...)."""
+    df = pd.read_csv(get_data_path('df_organs.csv', legislature))
+    df['type'] = df['type'].astype('category')
+    return df
+
+
+@cache_resource('load', version=get_data_version)
+def get_data_deputies_in_organs(legislature):
+    """Membership table between organs and deputies."""
+    return pd.read_csv(get_data_path('df_deputies_in_organs.csv', legislature))
+
+
+# Datasets by name, pages declare the ones they need in their DATASETS list
+DATASETS = {
+    'deputies': get_data_deputies,
+    'political parties': get_data_political_parties,
+    'votes': get_data_votes,
+    'vote requesters': get_data_vote_requesters,
+    'organs': get_data_organs,
+    'deputies in organs': get_data_deputies_in_organs
+}
+
+
+def load_datasets(names, legislature):
+    """Loads the named datasets of a legislature, the ones already loaded are taken from the cache."""
+    return {name: DATASETS[name](legislature) for name in names}
+
+
+###
+# Nominative vote table
+# The table has one row per deputy per scrutin. Besides the csv, the ETL writes a binary snapshot (df_vote_total.npz)
+# of each year where the deputy and scrutin codes are stored once in dictionary tables and referenced by integer
+# indices, and the four vote flags are packed as the bits of a single uint8 column. Loading it requires no parsing.
+
+VOTE_FLAGS = ['pour', 'contre', 'abstentions', 'par delegation']
+
+
+def save_vote_total_snapshot(df, path):
+    """Writes the nominative vote table as a binary snapshot.
+    Parameters
+    ----------
+    df:
+        the vote table with the columns 'scrutin', 'deputy code' and the vote flags.
+    path:
+        destination of the snapshot.
+    """
+    deputy_code = pd.Categorical(df['deputy code'])
+    scrutin = pd.Categorical(df['scrutin'])
+    flags = np.zeros(len(df), dtype=np.uint8)
+    for bit, column in enumerate(VOTE_FLAGS):
+        flags |= df[column].to_numpy().astype(bool).astype(np.uint8) << bit
+    np.savez(path,
+             deputy_index=deputy_code.codes,
+             deputy_codes=deputy_code.categories.to_numpy(dtype=str),
+             scrutin_index=scrutin.codes,
+             scrutin_codes=scrutin.categories.to_numpy(dtype=str),
+             flags=flags)
+
+
+def load_vote_total_snapshot(path):
+    """Reads a snapshot written by save_vote_total_snapshot back into the vote table."""
+    with np.load(path, allow_pickle=False) as snapshot:
+        df = pd.DataFrame({
+            'scrutin': pd.Categorical.from_codes(snapshot['scrutin_index'], snapshot['scrutin_codes']),
+            'deputy code': pd.Categorical.from_codes(snapshot['deputy_index'], snapshot['deputy_codes'])
+        })
+        flags = snapshot['flags']
+    for bit, column in enumerate(VOTE_FLAGS):
+        df[column] = (flags & (1 << bit)).astype(bool)
+    return df
+
+
+def load_vote_total_csv(path):
+    df = pd.read_csv(path, dtype={column: bool for column in VOTE_FLAGS})
+    df['deputy code'] = df['deputy code'].astype("category")
+    df['scrutin'] = df['scrutin'].astype("category")
+    return df
+
+
+def read_vote_total_partition(legislature, year):
+    """Nominative votes of one year, the binary snapshot is used when present, the csv is parsed otherwise."""
+    path = get_data_path('df_vote_total.npz', legislature, year)
+    if os.path.exists(path):
+        return load_vote_total_snapshot(path)
+    return load_vote_total_csv(get_data_path('df_vote_total.csv', legislature, year))
+
+
+def read_vote_total(legislature, years=None):
+    """Nominative vote table of the selected years (all the years by default),
+    with categorical codes and boolean vote flags.
+    """
+    if not years:
+        years = get_vote_years(legislature)
+    partitions = [read_vote_total_partition(legislature, year) for year in years]
+    if len(partitions) == 1:
+        return partitions[0]
+    df = pd.DataFrame({column: union_categoricals([partition[column] for partition in partitions])
+                       for column in ['scrutin', 'deputy code']})
+    for column in VOTE_FLAGS:
+        df[column] = np.concatenate([partition[column].to_numpy() for partition in partitions])
+    return df
+
+
+###
+# Portraits
+# The pictures of the deputies are packed in a single file, data/pictures/portraits.bin, resized to the display size
+# and recompressed as JPEG. portraits.json holds the offset and length of each portrait in the file.
+# The file is memory mapped and a portrait is handed to st.image as encoded bytes, it is never decoded by the app.
+
+PORTRAIT_SIZE = (160, 200)
+PORTRAIT_QUALITY = 85
+
+
+def build_portrait_store(folder):
+    """Packs the pictures <deputy code>.jpg of folder in portraits.bin and writes their index in portraits.json."""
+    from PIL import Image
+
+    index = {}
+    with open(os.path.join(folder, 'portraits.bin'), 'wb') as f:
+        for file_name in sorted(os.listdir(folder)):
+            if not file_name.endswith('.jpg'):
+                continue
+            image = Image.open(os.path.join(folder, file_name))
+            image.thumbnail(PORTRAIT_SIZE)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            portrait = io.BytesIO()
+            image.save(portrait, 'JPEG', quality=PORTRAIT_QUALITY, optimize=True)
+            index[file_name[:-len('.jpg')]] = [f.tell(), len(portrait.getvalue())]
+            f.write(portrait.getvalue())
+    with open(os.path.join(folder, 'portraits.json'), 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+
+
+class PortraitStore:
+    """Read-only access to the portraits packed by build_portrait_store."""
+    def __init__(self, folder):
+        with open(os.path.join(folder, 'portraits.json'), encoding='utf-8') as f:
+            self.index = json.load(f)
+        with open(os.path.join(folder, 'portraits.bin'), 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, code):
+        if code not in self.index:
+            return None
+        offset, length = self.index[code]
+        return self.data[offset:offset + length]
+
+
+@cache_resource('load')
+def get_portrait_store():
+    folder = get_data_path('pictures')
+    if not os.path.exists(os.path.join(folder, 'portraits.bin')):
+        return None
+    return PortraitStore(folder)
+
+
+def get_portrait(code):
+    """Encoded picture of a deputy, None when there is no picture.
+    The bytes are the resized JPEG of portraits.bin, or the original JPG when the portraits were not packed.
+    """
+    store = get_portrait_store()
+    if store is not None:
+        return store.get(code)
+    path = get_data_path(os.path.join('pictures', code + '.jpg'))
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+if __name__ == '__main__':
+    # build the binary snapshots from existing csv files
+    for legislature in get_legislatures():
+        for year in get_vote_years(legislature):
+            save_vote_total_snapshot(load_vote_total_csv(get_data_path('df_vote_total.csv', legislature, year)),
+                                     get_data_path('df_vote_total.npz', legislature, year))
+    # pack the pictures of the deputies
+    build_portrait_store(get_data_path('pictures'))
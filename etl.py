@@ -0,0 +1,516 @@
+"""Builds the csv files loaded by the app from the open data json files.
+
+Command line replacement of notebooks/Load_data.ipynb. The json files of the
+deputies (PA*), organs (PO*) and scrutins (VT*) are parsed in parallel on a
+process pool, their records are collected in lists and every dataframe is
+built once at the end.
+
+The tables are written in data/<legislature>, with the votes split in one
+folder per year (see data_store.py).
+
+Usage:
+    python etl.py --json-dir data/json --data-dir data --legislature 15
+    python etl.py --incremental     # only parse the files added or changed since the last run
+    python etl.py --zip AMO10.json.zip --zip Scrutins_XV.json.zip   # read the archives without extracting them
+    python etl.py --download        # same with the archives of the national assembly website
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.request
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from data_store import save_vote_total_snapshot, load_vote_total_snapshot, get_vote_requesters
+
+# open data archives of the deputies, organs and scrutins, per legislature
+ARCHIVES = {
+    '15': [
+        'http://data.assemblee-nationale.fr/static/openData/repository/15/amo/deputes_actifs_mandats_actifs_organes/'
+        'AMO10_deputes_actifs_mandats_actifs_organes_XV.json.zip',
+        'http://data.assemblee-nationale.fr/static/openData/repository/15/loi/scrutins/Scrutins_XV.json.zip'
+    ]
+}
+
+# deputies of the parties with less than MIN_MEMBERS members are moved to the non declared party
+NON_DECLARED = 'PO746314'
+MIN_MEMBERS = 7
+
+PARTY_COLORS = ['tab:red', 'tab:olive', 'tab:green', 'tab:orange', 'tab:blue',
+                'tab:cyan', 'tab:brown', 'tab:purple', 'tab:pink', 'tab:grey']
+
+ACTIVITIES = {
+    'Cadres et professions intellectuelles supérieures': 'Cadres',
+    "Artisans, commerçants et chefs d'entreprise": 'Entrepreneurs',
+    'Professions Intermédiaires': 'Prof. inter.',
+    'Agriculteurs exploitants': 'Agriculteurs',
+    'Sans profession déclarée': 'Non déclaré',
+    'Autres personnes sans activité professionnelle': 'Non déclaré',
+    'inconnu': 'Non déclaré'
+}
+
+# flag columns of the requesters written in df_vote_descr.csv, the requesters are matched by data_store.REQUESTERS
+DEMANDEUR_COLUMNS = ['REP', 'LAREM', 'FI', 'PS', 'EELV', 'MODEM', 'ND', 'RPS', 'UDRL', 'PCF', 'CDP', 'GOV', 'COM SPE']
+
+DEP_COLUMNS = ["code", "sex", "family name", "first name", "date of birth", "activity", "pol party", "dep", "num_dep",
+               "circo"]
+ORGAN_COLUMNS = ["code", "type", "name", "abreviated_name"]
+DEP_IN_ORGAN_COLUMNS = ["code_organe", "code_deputy"]
+VOTE_DESCR_COLUMNS = ["code", "date", "type", "titre", "demandeur", "nb votants", "requis", "pour", "contre",
+                      "abstentions"]
+VOTE_TOTAL_COLUMNS = ["scrutin", "deputy code", "pour", "contre", "abstentions", "par delegation"]
+
+
+def as_list(value):
+    # the json files hold a single object instead of a list when there is only one element
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+###
+# Parsing of one json file
+# Each function returns plain python records, the dataframes are only built once all the files are parsed
+
+
+def parse_actor(data):
+    acteur = data['acteur']
+    code = acteur['uid']['#text']
+    ident = acteur['etatCivil']['ident']
+    mandats = as_list(acteur['mandats']['mandat'])
+
+    activity = acteur['profession']['socProcINSEE']['famSocPro']
+    if isinstance(activity, str) and len(activity) < 5:
+        activity = 'inconnu'
+    party = NON_DECLARED
+    dep = num_dep = circo = None
+    for mandat in mandats:
+        if mandat['typeOrgane'] == 'PARPOL':
+            party = mandat['organes']['organeRef']
+        if (mandat['typeOrgane'] == 'ASSEMBLEE') & (mandat['infosQualite']['codeQualite'] == 'membre'):
+            lieu = mandat['election']['lieu']
+            dep, num_dep, circo = lieu['departement'], lieu['numDepartement'], lieu['numCirco']
+
+    deputy = [code, 'male' if ident['civ'] == 'M.' else 'female', ident['nom'], ident['prenom'],
+              acteur['etatCivil']['infoNaissance']['dateNais'], activity, party, dep, num_dep, circo]
+    organs = [[mandat['organes']['organeRef'], code] for mandat in mandats]
+    return deputy, organs
+
+
+def parse_organ(data):
+    organe = data['organe']
+    return [organe['uid'], organe['codeType'], organe['libelle'], organe['libelleAbrev']]
+
+
+def parse_scrutin(data):
+    scrutin = data['scrutin']
+    synthese = scrutin['syntheseVote']
+    description = [scrutin['uid'], scrutin['dateScrutin'], scrutin['typeVote']['libelleTypeVote'], scrutin['titre'],
+                   scrutin['demandeur']['texte'], synthese['nombreVotants'], synthese['nbrSuffragesRequis'],
+                   synthese['decompte']['pour'], synthese['decompte']['contre'], synthese['decompte']['abstentions']]
+
+    votes = []
+    for groupe in as_list(scrutin['ventilationVotes']['organe']['groupes']['groupe']):
+        decompte = groupe['vote']['decompteNominatif']
+        for key, flags in [('pours', [1, 0, 0]), ('contres', [0, 1, 0]), ('abstentions', [0, 0, 1])]:
+            if decompte[key] is None:
+                continue
+            for votant in as_list(decompte[key]['votant']):
+                delegation = 1 if str(votant.get('parDelegation')).lower() in ['true', '1'] else 0
+                votes.append([scrutin['uid'], votant['acteurRef']] + flags + [delegation])
+    return description, votes
+
+
+###
+# Sources of the json files
+# A source is either the path of an extracted json file or a (zip archive, member) pair. Members of the open data
+# archives are streamed one at a time from the archive, nothing is extracted on disk.
+
+# archives opened by the current worker process, kept open between two members
+_archives = {}
+
+
+def source_name(source):
+    if isinstance(source, tuple):
+        return os.path.basename(source[1])
+    return os.path.basename(source)
+
+
+def is_data_file(name):
+    return name[0:2] in ['PA', 'PO', 'VT'] and name.endswith('.json')
+
+
+def read_source(source):
+    if isinstance(source, tuple):
+        zip_path, member = source
+        if zip_path not in _archives:
+            _archives[zip_path] = zipfile.ZipFile(zip_path)
+        with _archives[zip_path].open(member) as f:
+            return json.load(f)
+    with open(source, 'rb') as f:
+        return json.load(f)
+
+
+def list_json_files(json_dir):
+    """Returns a {name: (source, signature)} dict of the json files of a folder, signed by size and mtime."""
+    sources = {}
+    for path, subdirs, files in os.walk(json_dir):
+        for name in files:
+            if is_data_file(name):
+                stat = os.stat(os.path.join(path, name))
+                sources[name] = (os.path.join(path, name), [stat.st_size, stat.st_mtime_ns])
+    return sources
+
+
+def list_zip_members(zip_path):
+    """Returns a {name: (source, signature)} dict of the json members of an archive, signed by size and crc."""
+    sources = {}
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if is_data_file(name):
+                sources[name] = ((zip_path, info.filename), [info.file_size, info.CRC])
+    return sources
+
+
+def fetch_archive(url, folder):
+    """Downloads an archive in folder, the content is streamed to the file and not kept in memory."""
+    path = os.path.join(folder, os.path.basename(url))
+    with urllib.request.urlopen(url) as response, open(path, 'wb') as f:
+        shutil.copyfileobj(response, f)
+    return path
+
+
+def parse_file(source):
+    """Parses one json file, the kind of record is given by the prefix of its name."""
+    data = read_source(source)
+    prefix = source_name(source)[0:2]
+    if prefix == 'PA':
+        return prefix, parse_actor(data)
+    if prefix == 'PO':
+        return prefix, parse_organ(data)
+    return prefix, parse_scrutin(data)
+
+
+def parse_files(sources, workers=None):
+    """Parses the files on a process pool and collects the records per kind.
+    'codes' maps the name of each parsed file to the code of the deputy, organ or scrutin it describes.
+    """
+    records = {'deputies': [], 'organs_of_deputies': [], 'organs': [], 'votes': [], 'nominative_votes': [],
+               'codes': {}}
+    if not sources:
+        return records
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for source, (prefix, record) in zip(sources, executor.map(parse_file, sources, chunksize=64)):
+            if prefix == 'PA':
+                records['deputies'].append(record[0])
+                records['organs_of_deputies'].extend(record[1])
+                code = record[0][0]
+            elif prefix == 'PO':
+                records['organs'].append(record)
+                code = record[0]
+            else:
+                records['votes'].append(record[0])
+                records['nominative_votes'].extend(record[1])
+                code = record[0][0]
+            records['codes'][source_name(source)] = code
+    return records
+
+
+###
+# Construction of the dataframes
+
+
+def build_deputies_and_parties(deputies, organs):
+    df_dep = pd.DataFrame(deputies, columns=DEP_COLUMNS)
+    df_organs = pd.DataFrame(organs, columns=ORGAN_COLUMNS)
+    df_polpar = df_organs.loc[df_organs['type'] == 'PARPOL'].drop(columns=['type']).reset_index(drop=True)
+
+    # aggregate the parties with few members into the not declared party
+    members = df_dep['pol party'].value_counts()
+    df_dep.loc[df_dep['pol party'].isin(members[members < MIN_MEMBERS].index), 'pol party'] = NON_DECLARED
+    members = df_dep['pol party'].value_counts()
+    df_polpar = df_polpar.loc[df_polpar['code'].isin(members.index)].reset_index(drop=True)
+    df_polpar['members'] = df_polpar['code'].map(members).astype(int)
+    df_polpar['color'] = [PARTY_COLORS[i % len(PARTY_COLORS)] for i in range(len(df_polpar))]
+
+    # replace the political party code by its abreviated name
+    df_dep['pol party'] = df_dep['pol party'].map(df_polpar.set_index('code')['abreviated_name'])
+    df_dep['activity'] = df_dep['activity'].replace(ACTIVITIES)
+    return df_dep, df_polpar
+
+
+def add_demandeur_columns(df_vote_descr):
+    df_vote_descr['demandeur'] = df_vote_descr['demandeur'].fillna("a")
+    requesters = get_vote_requesters(df_vote_descr)
+    for party in DEMANDEUR_COLUMNS:
+        codes = requesters.loc[requesters['requester'] == party, 'code']
+        df_vote_descr['demandeur ' + party] = df_vote_descr['code'].isin(codes).astype(int)
+    return df_vote_descr
+
+
+def build_votes(votes, nominative_votes):
+    df_vote_descr = pd.DataFrame(votes, columns=VOTE_DESCR_COLUMNS)
+    numeric_columns = ["nb votants", "requis", "pour", "contre", "abstentions"]
+    df_vote_descr[numeric_columns] = df_vote_descr[numeric_columns].apply(pd.to_numeric)
+    df_vote_descr = add_demandeur_columns(df_vote_descr)
+    df_vote_total = pd.DataFrame(nominative_votes, columns=VOTE_TOTAL_COLUMNS)
+    return df_vote_descr, df_vote_total
+
+
+###
+# Incremental refresh
+# The manifest (etl_manifest.json in the data folder) records the size, the modification time (crc for the members
+# of an archive) and the code of every parsed json file, as well as the raw record of every deputy. A refresh only
+# parses the files that are new or changed since the last run and patches the rows they produce in the existing tables.
+
+MANIFEST = 'etl_manifest.json'
+
+
+def load_manifest(data_dir):
+    path = os.path.join(data_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'files': {}, 'deputies': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, data_dir):
+    with open(os.path.join(data_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def patch_csv(path, df_delta, key, replaced):
+    """Writes the rows of df_delta in the csv file at path.
+    The rows whose key is in replaced are removed first, which requires rewriting the file.
+    When none of them is in the file the new rows are only appended.
+    """
+    if not os.path.exists(path):
+        df_delta.to_csv(path, index=False)
+        return
+    if replaced:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+        removed = df[key].isin(replaced)
+        if removed.any():
+            pd.concat([df.loc[~removed], df_delta]).to_csv(path, index=False)
+            return
+    if len(df_delta.index):
+        df_delta.to_csv(path, mode='a', header=False, index=False)
+
+
+def patch_vote_total(folder, df_delta, replaced):
+    """Patches the nominative vote table of a partition, in csv and in the binary snapshot."""
+    csv_path = os.path.join(folder, 'df_vote_total.csv')
+    snapshot_path = os.path.join(folder, 'df_vote_total.npz')
+    if not os.path.exists(snapshot_path):
+        patch_csv(csv_path, df_delta, 'scrutin', replaced)
+        save_vote_total_snapshot(pd.read_csv(csv_path), snapshot_path)
+        return
+    # the snapshot is patched from its previous version, it also tells if the csv holds replaced rows
+    # without parsing it
+    df = load_vote_total_snapshot(snapshot_path)
+    removed = df['scrutin'].isin(replaced)
+    if not removed.any() and not len(df_delta.index):
+        return
+    patch_csv(csv_path, df_delta, 'scrutin', replaced if removed.any() else [])
+    df = df.loc[~removed].astype({'scrutin': str, 'deputy code': str})
+    save_vote_total_snapshot(pd.concat([df, df_delta]), snapshot_path)
+
+
+###
+# Partitions
+# The tables of a legislature are written in data/<legislature>, the votes are split in one folder per year,
+# data/<legislature>/votes/<year>.
+
+
+def get_vote_years(df_vote_descr, df_vote_total):
+    """Year of each scrutin of df_vote_descr and of each row of df_vote_total."""
+    years = df_vote_descr['date'].astype(str).str[0:4]
+    return years, df_vote_total['scrutin'].map(pd.Series(years.to_numpy(), index=df_vote_descr['code']))
+
+
+def write_vote_partitions(folder, df_vote_descr, df_vote_total):
+    years, total_years = get_vote_years(df_vote_descr, df_vote_total)
+    for year in sorted(years.unique()):
+        partition = os.path.join(folder, 'votes', year)
+        os.makedirs(partition, exist_ok=True)
+        df_vote_descr.loc[years == year].to_csv(os.path.join(partition, 'df_vote_descr.csv'), index=False)
+        df_year = df_vote_total.loc[total_years == year]
+        df_year.to_csv(os.path.join(partition, 'df_vote_total.csv'), index=False)
+        save_vote_total_snapshot(df_year, os.path.join(partition, 'df_vote_total.npz'))
+
+
+def patch_vote_partitions(folder, df_vote_descr, df_vote_total, replaced):
+    years, total_years = get_vote_years(df_vote_descr, df_vote_total)
+    partitions = set(years.unique())
+    if replaced:
+        # the rows of the replaced scrutins may be in any of the existing partitions
+        votes_folder = os.path.join(folder, 'votes')
+        partitions.update(name for name in os.listdir(votes_folder) if name.isdigit())
+    for year in sorted(partitions):
+        partition = os.path.join(folder, 'votes', year)
+        os.makedirs(partition, exist_ok=True)
+        descr_path = os.path.join(partition, 'df_vote_descr.csv')
+        patch_csv(descr_path, df_vote_descr.loc[years == year], 'code', replaced)
+        if pd.read_csv(descr_path, usecols=['code']).empty:
+            # every scrutin of the year was deleted or moved to another year, the app lists the years from the
+            # partition folders and would show an empty year
+            shutil.rmtree(partition)
+            continue
+        patch_vote_total(partition, df_vote_total.loc[total_years == year], replaced)
+
+
+def write_legislature_info(folder, legislature):
+    """Writes legislature.json, the dates of the first and last votes are read from the vote partitions."""
+    dates = pd.Series([], dtype=str)
+    votes_folder = os.path.join(folder, 'votes')
+    if os.path.isdir(votes_folder):
+        dates = pd.concat([dates] + [pd.read_csv(os.path.join(votes_folder, year, 'df_vote_descr.csv'),
+                                                 usecols=['date'], dtype=str)['date']
+                                     for year in os.listdir(votes_folder)])
+    info = {'legislature': str(legislature),
+            'first vote': dates.min() if len(dates.index) else None,
+            'last vote': dates.max() if len(dates.index) else None}
+    with open(os.path.join(folder, 'legislature.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, indent=4)
+        f.write('\n')
+
+
+###
+# Command line
+
+
+class Timer:
+    """Prints the time spent in each step of the pipeline."""
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+
+    def step(self, name):
+        now = time.perf_counter()
+        print('{:<40}{:>8.2f} s'.format(name, now - self.last))
+        self.last = now
+
+    def total(self):
+        print('{:<40}{:>8.2f} s'.format('total', time.perf_counter() - self.start))
+
+
+def write_all(data_dir, records):
+    df_dep, df_polpar = build_deputies_and_parties(records['deputies'], records['organs'])
+    df_organs = pd.DataFrame(records['organs'], columns=ORGAN_COLUMNS)
+    df_deputies_in_organs = pd.DataFrame(records['organs_of_deputies'], columns=DEP_IN_ORGAN_COLUMNS)
+    df_vote_descr, df_vote_total = build_votes(records['votes'], records['nominative_votes'])
+
+    df_dep.to_csv(os.path.join(data_dir, 'df_dep.csv'), index=False)
+    df_polpar.to_csv(os.path.join(data_dir, 'df_polpar.csv'), index=False)
+    df_organs.to_csv(os.path.join(data_dir, 'df_organs.csv'), index=False)
+    df_deputies_in_organs.to_csv(os.path.join(data_dir, 'df_deputies_in_organs.csv'), index=False)
+    write_vote_partitions(data_dir, df_vote_descr, df_vote_total)
+
+
+def write_delta(data_dir, records, replaced, deputies):
+    """Patches the existing tables with the records of the new and changed files.
+    replaced holds, per kind of file, the codes whose rows must be removed (changed or deleted files).
+    deputies holds the raw records of all the deputies, the deputies and parties tables are rebuilt from them.
+    """
+    if records['organs'] or replaced['PO']:
+        patch_csv(os.path.join(data_dir, 'df_organs.csv'), pd.DataFrame(records['organs'], columns=ORGAN_COLUMNS),
+                  'code', replaced['PO'])
+    if records['deputies'] or replaced['PA'] or records['organs'] or replaced['PO']:
+        organs = pd.read_csv(os.path.join(data_dir, 'df_organs.csv'), dtype=str, keep_default_na=False)
+        df_dep, df_polpar = build_deputies_and_parties(deputies, organs.values.tolist())
+        df_dep.to_csv(os.path.join(data_dir, 'df_dep.csv'), index=False)
+        df_polpar.to_csv(os.path.join(data_dir, 'df_polpar.csv'), index=False)
+        patch_csv(os.path.join(data_dir, 'df_deputies_in_organs.csv'),
+                  pd.DataFrame(records['organs_of_deputies'], columns=DEP_IN_ORGAN_COLUMNS),
+                  'code_deputy', replaced['PA'])
+    if records['votes'] or replaced['VT']:
+        # the demandeur flags are only computed for the new rows
+        df_vote_descr, df_vote_total = build_votes(records['votes'], records['nominative_votes'])
+        patch_vote_partitions(data_dir, df_vote_descr, df_vote_total, replaced['VT'])
+
+
+def run(data_dir, legislature, json_dir=None, zip_paths=(), workers=None, incremental=False):
+    """Builds the tables of a legislature from the json files of json_dir or from the members of the zip archives.
+    zip_paths may hold local paths or urls of archives, which are downloaded in a temporary folder first.
+    The tables are written in data_dir/<legislature>.
+    """
+    timer = Timer()
+    folder = os.path.join(data_dir, str(legislature))
+    os.makedirs(folder, exist_ok=True)
+    with tempfile.TemporaryDirectory() as download_dir:
+        if any(path.startswith('http') for path in zip_paths):
+            zip_paths = [fetch_archive(path, download_dir) if path.startswith('http') else path for path in zip_paths]
+            timer.step('download archives')
+        sources = {}
+        if json_dir is not None:
+            sources.update(list_json_files(json_dir))
+        for zip_path in zip_paths:
+            sources.update(list_zip_members(zip_path))
+        update(folder, sources, workers, incremental, timer)
+    write_legislature_info(folder, legislature)
+
+
+def update(data_dir, sources, workers, incremental, timer):
+    manifest = load_manifest(data_dir) if incremental else {'files': {}, 'deputies': {}}
+    signatures = {name: signature for name, (source, signature) in sources.items()}
+    changed = [source for name, (source, signature) in sorted(sources.items())
+               if manifest['files'].get(name, [])[0:2] != signature]
+    replaced = {'PA': [], 'PO': [], 'VT': []}
+    for name, (size, stamp, code) in manifest['files'].items():
+        if [size, stamp] != signatures.get(name):
+            replaced[name[0:2]].append(code)
+    timer.step('list {} json files, {} to parse'.format(len(sources), len(changed)))
+
+    records = parse_files(changed, workers)
+    timer.step('parse json files')
+
+    deputies = {code: deputy for code, deputy in manifest['deputies'].items() if code not in replaced['PA']}
+    deputies.update({deputy[0]: deputy for deputy in records['deputies']})
+    if manifest['files']:
+        write_delta(data_dir, records, replaced, list(deputies.values()))
+    else:
+        write_all(data_dir, records)
+    timer.step('write csv and snapshot')
+
+    files = dict(records['codes'])
+    for name, (size, stamp, code) in manifest['files'].items():
+        if name in signatures and name not in files:
+            files[name] = code
+    manifest = {'files': {name: signatures[name] + [code] for name, code in files.items()}, 'deputies': deputies}
+    save_manifest(manifest, data_dir)
+    timer.total()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--json-dir', default=None,
+                        help='folder holding the extracted PA*, PO* and VT* json files (default: data/json)')
+    parser.add_argument('--zip', action='append', default=[], dest='zip_paths',
+                        help='path or url of an open data archive to read the json files from, can be repeated')
+    parser.add_argument('--download', action='store_true',
+                        help='read the deputies and scrutins archives of the national assembly website')
+    parser.add_argument('--legislature', default='15', help='number of the legislature of the json files')
+    parser.add_argument('--data-dir', default='data',
+                        help='folder where the csv files are written, in a sub folder per legislature')
+    parser.add_argument('--workers', type=int, default=None, help='number of parsing processes')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only parse the files that are new or changed since the last run')
+    args = parser.parse_args()
+    if args.download and args.legislature not in ARCHIVES:
+        parser.error('no archive known for legislature {}, use --zip'.format(args.legislature))
+    zip_paths = args.zip_paths + (ARCHIVES[args.legislature] if args.download else [])
+    json_dir = args.json_dir
+    if json_dir is None and not zip_paths:
+        json_dir = os.path.join('data', 'json')
+    run(args.data_dir, args.legislature, json_dir, zip_paths, args.workers, args.incremental)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Cache of the rendered charts of the pages, shared by all the sessions.
+
+Most charts only depend on a few small inputs (the counts of a donut, the
+selected party...) which rarely change between two reruns, but redrawing them
+with matplotlib is the slowest part of a page. Each chart is identified by a
+key computed from its chart id and its normalized inputs, the encoded PNG is
+stored under that key. On a hit the PNG bytes are sent as is, matplotlib is
+not involved at all.
+The cache holds at most MAX_BYTES of images, the least recently used ones are
+evicted first.
+
+Charts are drawn with the object oriented matplotlib API (a Figure per chart,
+no pyplot state), so the sessions draw their charts in parallel instead of
+taking turns on the global RendererAgg lock. Drawing happens in the thread of
+the session.
+
+With the environment variable CHART_BACKEND set to 'vega-lite', the charts
+which have a Vega-Lite spec are not drawn on the server at all, their data is
+sent to the browser which draws them (see client_charts.py).
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from metrics import add_gauges, count, lock_wait, span
+
+MAX_BYTES = 64 * 1024 * 1024
+# 'matplotlib' (PNG drawn by the server) or 'vega-lite' (data and spec drawn by the browser)
+CHART_BACKEND = os.environ.get('CHART_BACKEND', 'matplotlib')
+
+# same encoding as st.pyplot
+SAVEFIG_OPTIONS = {'bbox_inches': 'tight', 'dpi': 200, 'format': 'png'}
+
+
+class FigureCache:
+    """LRU cache of encoded images, bounded by the total size of the images.
+    Attributes
+    ----------
+    max_bytes:
+        maximum total size of the stored images.
+    hits, misses:
+        number of lookups which found or did not find their image.
+    """
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with lock_wait(self._lock, 'figure cache'):
+            image = self.images.get(key)
+            if image is None:
+                self.misses = self.misses + 1
+                return None
+            self.hits = self.hits + 1
+            self.images.move_to_end(key)
+            return image
+
+    def put(self, key, image):
+        with lock_wait(self._lock, 'figure cache'):
+            if key in self.images:
+                self.size = self.size - len(self.images.pop(key))
+            # an image larger than the whole cache is not stored
+            if len(image) > self.max_bytes:
+                return
+            self.images[key] = image
+            self.size = self.size + len(image)
+            while self.size > self.max_bytes:
+                _, evicted = self.images.popitem(last=False)
+                self.size = self.size - len(evicted)
+                self.evictions = self.evictions + 1
+
+    def clear(self):
+        with lock_wait(self._lock, 'figure cache'):
+            self.images.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self.images), 'bytes': self.size, 'max bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+_figure_cache = FigureCache()
+
+
+def get_figure_cache():
+    return _figure_cache
+
+
+add_gauges('figure_cache', lambda: get_figure_cache().stats())
+
+
+###
+# Keys
+# The inputs of a chart are normalized to bytes before hashing: dataframes and series by their values, index and
+# names, arrays by their dtype, shape and buffer, containers element by element and anything else by its repr.
+
+
+def _update_hash(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        digest.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, pd.Index):
+        _update_hash(digest, value.to_series())
+    elif isinstance(value, np.ndarray):
+        digest.update(str(value.dtype).encode() + repr(value.shape).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[' + str(len(value)).encode())
+        for item in value:
+            _update_hash(digest, item)
+    elif isinstance(value, dict):
+        digest.update(b'{' + str(len(value)).encode())
+        for name in sorted(value, key=repr):
+            _update_hash(digest, name)
+            _update_hash(digest, value[name])
+    else:
+        digest.update(repr(value).encode())
+    digest.update(b';')
+
+
+def make_key(chart_id, *inputs):
+    """Key of a chart, the same chart id and equal inputs always give the same key."""
+    digest = hashlib.sha256(chart_id.encode())
+    _update_hash(digest, inputs)
+    return digest.hexdigest()
+
+
+###
+# Rendering
+
+
+def encode_figure(fig):
+    image = io.BytesIO()
+    fig.savefig(image, **SAVEFIG_OPTIONS)
+    return image.getvalue()
+
+
+def draw_and_encode(draw, inputs):
+    return encode_figure(draw(*inputs))
+
+
+def render_figure(chart_id, inputs, draw):
+    """PNG bytes of a chart, drawn only when the cache does not already hold it.
+    Parameters
+    ----------
+    chart_id:
+        name of the chart, unique over all the pages.
+    inputs:
+        tuple of every value the chart depends on.
+    draw:
+        function called with the inputs on a cache miss, returns a matplotlib Figure built without pyplot.
+    """
+    cache = get_figure_cache()
+    key = make_key(chart_id, *inputs)
+    image = cache.get(key)
+    count('figure_cache_requests', name=chart_id, result='hit' if image is not None else 'miss')
+    if image is None:
+        with span('render', chart_id):
+            image = draw_and_encode(draw, inputs)
+        cache.put(key, image)
+    return image
+
+
+def st_figure(chart_id, inputs, draw, spec=None):
+    """Displays a chart like st.pyplot, through the figure cache.
+    With the vega-lite backend, a chart with a spec function (module level function called with the inputs,
+    returning the data and the Vega-Lite spec of the chart) is drawn by the browser instead.
+    """
+    if CHART_BACKEND == 'vega-lite' and spec is not None:
+        with span('render', chart_id):
+            data, chart_spec = spec(*inputs)
+        st.vega_lite_chart(data, chart_spec, use_container_width=True)
+        return
+    st.image(render_figure(chart_id, inputs, draw), use_column_width=True)
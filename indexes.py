@@ -0,0 +1,177 @@
+"""Indexes built once per dataset to answer the selections of the pages.
+
+The deputies page filters the deputies by departement, sex and party and
+lists the ones left sorted by sex and name. Instead of masking and sorting
+the deputies frame on every rerun, each value of a filter is mapped once to
+the sorted array of the ranks of its deputies in the display order. A
+selection is then the intersection of a few small sorted arrays.
+Names are searched accent and case insensitively, by prefix of any part of
+the name, with a fuzzy match as fallback.
+
+The votes page searches the titles and requesters of the scrutins through an
+inverted index: the sorted folded words, each pointing to the scrutins
+containing it with its BM25 weight. A query only adds up the weights of the
+postings of its words.
+"""
+import difflib
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from data_store import get_data_deputies, get_data_version, get_data_votes
+from resource_cache import cache_resource
+
+
+def fold(text):
+    """Lower case text without accents nor punctuation, 'Jean-Luc Mélenchon' -> 'jean luc melenchon'."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return ' '.join(re.split(r'[\W_]+', text.lower())).strip()
+
+
+def group_ranks(values, ranks):
+    """Sorted array of ranks of each distinct value."""
+    groups = pd.Series(ranks).groupby(np.asarray(values), observed=True)
+    return {value: np.sort(group.to_numpy()) for value, group in groups}
+
+
+class DeputyIndex:
+    """Indexes of the deputies for the sidebar filters and the name search.
+    Attributes
+    ----------
+    positions:
+        row of df_dep of each deputy, in display order (by sex then full name).
+    names:
+        full name of each deputy, in display order.
+    departements:
+        departements sorted by number.
+    by_departement, by_party, by_sex:
+        sorted arrays of the display ranks of the deputies of each value.
+    """
+    def __init__(self, df_dep):
+        order = df_dep.sort_values(by=['sex', 'full_name']).index
+        self.positions = df_dep.index.get_indexer(order)
+        self.names = df_dep['full_name'].to_numpy()[self.positions]
+        ranks = np.arange(len(self.positions))
+        self.departements = df_dep['departement'].cat.categories.tolist()
+        self.by_departement = group_ranks(df_dep['departement'].to_numpy()[self.positions], ranks)
+        self.by_party = group_ranks(df_dep['pol party'].astype(str).to_numpy()[self.positions], ranks)
+        self.by_sex = group_ranks(df_dep['sex'].astype(str).to_numpy()[self.positions], ranks)
+
+        # every suffix of the folded name is a search key, so that a prefix of the family name is found too
+        keys = []
+        key_ranks = []
+        for rank, name in enumerate(self.names):
+            words = fold(name).split(' ')
+            for i in range(len(words)):
+                keys.append(' '.join(words[i:]))
+                key_ranks.append(rank)
+        order = np.argsort(keys, kind='stable')
+        self.keys = np.array(keys, dtype=object)[order]
+        self.key_ranks = np.array(key_ranks)[order]
+        self.unique_keys = pd.unique(self.keys).tolist()
+
+    def _union(self, index, values):
+        arrays = [index[value] for value in values if value in index]
+        if not arrays:
+            return np.array([], dtype=int)
+        return np.unique(np.concatenate(arrays))
+
+    def select(self, departements=None, parties=None, sexes=None):
+        """Display ranks of the deputies matching every given filter, a filter set to None selects everything."""
+        ranks = np.arange(len(self.positions))
+        for index, values in [(self.by_departement, departements), (self.by_party, parties), (self.by_sex, sexes)]:
+            if values is not None:
+                ranks = np.intersect1d(ranks, self._union(index, values), assume_unique=True)
+        return ranks
+
+    def search(self, query, limit=20):
+        """Display ranks of the deputies whose name matches the query, best matches first.
+        A part of the name starting with the query is a match, when there is none the closest names are returned.
+        """
+        query = fold(query)
+        if not query:
+            return np.arange(len(self.positions))
+        start = np.searchsorted(self.keys, query, side='left')
+        end = np.searchsorted(self.keys, query + '\uffff', side='left')
+        ranks = pd.unique(self.key_ranks[start:end])
+        if len(ranks) == 0:
+            matches = difflib.get_close_matches(query, self.unique_keys, n=limit, cutoff=0.6)
+            position = {key: i for i, key in enumerate(matches)}
+            found = [(position[key], rank) for key, rank in zip(self.keys, self.key_ranks) if key in position]
+            ranks = pd.unique(np.array([rank for _, rank in sorted(found)], dtype=int))
+        return np.asarray(ranks[:limit], dtype=int)
+
+
+@cache_resource('compute', version=get_data_version)
+def get_deputy_index(legislature):
+    return DeputyIndex(get_data_deputies(legislature))
+
+
+###
+# Scrutins
+# BM25 parameters, the usual values
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _is_term(word):
+    # the articles and pronouns elided in french ("l'article", "d'habilitation") are not searched
+    return len(word) > 1 or word.isdigit()
+
+
+class ScrutinIndex:
+    """Inverted index of the words of the title ('titre') and requester ('demandeur') of the scrutins.
+    Attributes
+    ----------
+    codes:
+        code of each scrutin, in the order of the votes dataset.
+    terms:
+        sorted array of the distinct folded words (words of one letter other than a digit are left out).
+    starts:
+        int array of shape (terms + 1,), the postings of terms[i] are at starts[i]:starts[i + 1].
+    postings, weights:
+        position in codes of the scrutins containing each term, and the BM25 weight of the term in the scrutin.
+    """
+    def __init__(self, df_votes):
+        self.codes = df_votes['code'].to_numpy()
+        texts = df_votes['titre'].fillna('') + ' ' + df_votes['demandeur'].fillna('')
+        words = [[word for word in fold(text).split(' ') if _is_term(word)] for text in texts]
+        lengths = np.array([len(document) for document in words])
+        documents = np.repeat(np.arange(len(words)), lengths)
+        words = np.array([word for document in words for word in document], dtype=object)
+
+        # one posting per distinct (term, scrutin), with the number of occurrences of the term in the scrutin
+        self.terms, term_ids = np.unique(words, return_inverse=True)
+        pairs, frequencies = np.unique(term_ids.astype(np.int64)*len(self.codes) + documents, return_counts=True)
+        term_ids, self.postings = np.divmod(pairs, len(self.codes))
+        self.starts = np.searchsorted(term_ids, np.arange(len(self.terms) + 1))
+
+        idf = np.log(1 + (len(self.codes) - np.diff(self.starts) + 0.5)/(np.diff(self.starts) + 0.5))
+        norm = BM25_K1*(1 - BM25_B + BM25_B*lengths[self.postings]/max(lengths.mean(), 1))
+        self.weights = idf[term_ids]*frequencies*(BM25_K1 + 1)/(frequencies + norm)
+
+    def search(self, query, limit=20):
+        """Positions in codes of the scrutins matching the query and their scores, best matches first.
+        Each word of the query matches the words starting with it, the scrutins matching the most words of the
+        query come first, then the ones with the highest BM25 score.
+        """
+        scores = np.zeros(len(self.codes))
+        matched = np.zeros(len(self.codes), dtype=int)
+        for word in set(word for word in fold(query).split(' ') if _is_term(word)):
+            start = np.searchsorted(self.terms, word, side='left')
+            end = np.searchsorted(self.terms, word + '\uffff', side='left')
+            positions = np.arange(self.starts[start], self.starts[end])
+            np.add.at(scores, self.postings[positions], self.weights[positions])
+            matched[np.unique(self.postings[positions])] += 1
+        found = np.flatnonzero(matched)
+        order = np.lexsort((-scores[found], -matched[found]))[:limit]
+        return found[order], scores[found[order]]
+
+
+@cache_resource('compute', version=get_data_version)
+def get_scrutin_index(legislature):
+    return ScrutinIndex(get_data_votes(legislature))
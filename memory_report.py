@@ -0,0 +1,76 @@
+"""Memory taken by the datasets cached by the app.
+
+Reports the size in bytes of each dataset of data_store and of each
+aggregate of aggregates.py, as held in memory by the server process. The
+votes and their requesters are reported per year, as they are cached, the
+tables of several years are concatenated on demand and not kept.
+The figure cache and the API response cache are shared by the legislatures,
+their size is reported once, it is the one of the current process.
+
+Usage:
+    python memory_report.py [legislature ...]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+from aggregates import (get_vote_matrix, get_deputy_vote_totals, get_party_vote_totals, get_party_vote_ratios,
+                        get_demographic_cube, get_vote_calendar, get_party_positions, get_deputy_neighbours,
+                        get_participation_series)
+from api import get_response_cache
+from data_store import (DATASETS, get_data_vote_requesters_partition, get_data_votes_partition, get_legislatures,
+                        get_vote_years, load_datasets)
+from figure_cache import get_figure_cache
+
+# concatenations of the partitions of every year, reported per partition
+CONCATENATED = ['votes', 'vote requesters']
+
+
+def get_nbytes(value):
+    """Size in memory of a dataset, strings and other python objects of the frames included."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    # arrays and the aggregates of aggregates.py report their own size
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+def get_memory_report(legislature):
+    """Bytes taken by each cached dataset of a legislature, sorted by decreasing size.
+    The datasets which are not loaded yet are loaded.
+    """
+    datasets = load_datasets([name for name in DATASETS if name not in CONCATENATED], legislature)
+    datasets['vote matrix'] = get_vote_matrix(legislature)
+    datasets['deputy vote totals'] = get_deputy_vote_totals(legislature)
+    datasets['party vote totals'] = get_party_vote_totals(legislature)
+    datasets['party vote ratios'] = get_party_vote_ratios(legislature)
+    datasets['party positions'] = get_party_positions(legislature)
+    datasets['deputy neighbours'] = get_deputy_neighbours(legislature)
+    datasets['participation series'] = get_participation_series(legislature)
+    datasets['demographic cube'] = get_demographic_cube(legislature).counts
+    for year in get_vote_years(legislature):
+        datasets['votes ' + year] = get_data_votes_partition(legislature, year)
+        datasets['vote requesters ' + year] = get_data_vote_requesters_partition(legislature, year)
+        datasets['vote calendar ' + year] = get_vote_calendar(legislature, year)
+    report = pd.Series({name: get_nbytes(dataset) for name, dataset in datasets.items()}, name='bytes')
+    return report.sort_values(ascending=False)
+
+
+def get_cache_report():
+    """Bytes of the encoded images of the figure cache and of the json bodies of the response cache."""
+    return pd.Series({'figure cache': get_figure_cache().stats()['bytes'],
+                      'response cache': get_response_cache().stats()['bytes']}, name='bytes')
+
+
+if __name__ == '__main__':
+    for legislature in sys.argv[1:] or get_legislatures():
+        report = get_memory_report(legislature)
+        print('legislature', legislature)
+        print(report.to_string())
+        print('total', report.sum())
+        print()
+    print(get_cache_report().to_string())
@@ -0,0 +1,278 @@
+"""Timing spans and cache counters of the page runs, exported for monitoring.
+
+Set the environment variable METRICS_FILE to a path to instrument the app.
+Every run of a page is then split in named spans:
+    page     the whole run of the page (MultiApp.run)
+    load     the datasets read, one span per cached loader of data_store missing from the cache
+    compute  the aggregates and indexes built, one span per cached function of aggregates.py and indexes.py missing
+             from the cache
+    render   the charts drawn, one span per chart missing from the figure cache
+    lock     the time waited for the lock of the figure cache
+    api      the answers of the JSON API (api.py) missing from its cache, one span per path
+and every cached function (see resource_cache.py) counts its hits and misses,
+the figure cache its hits and misses per chart.
+Spans nest (a loader called by an aggregate, the aggregates called by another
+one...), each span only counts its self time, the time of the spans opened
+inside it is left out, so that no time is counted twice in the totals of the
+stages. Only the page span counts the whole run.
+After each run of a page, the spans of the run are logged as one json line
+(logger 'metrics', on stderr), and the totals of the process are written in
+METRICS_FILE in the Prometheus text format, as they are after each request of
+the JSON API. `python metrics.py --port 9100` serves that file on
+http://localhost:9100/metrics.
+
+Without METRICS_FILE nothing is measured: span and lock_wait return a shared
+no-op context manager and count returns at once.
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+METRICS_FILE = os.environ.get('METRICS_FILE', '')
+ENABLED = bool(METRICS_FILE)
+# prefix of the names of the exported metrics
+NAMESPACE = 'national_assembly'
+
+logger = logging.getLogger('metrics')
+if ENABLED and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_DISABLED = nullcontext()
+# trace of the page run of the thread, and its open spans
+_local = threading.local()
+
+
+class Metrics:
+    """Totals of the spans and counters of the process.
+    Attributes
+    ----------
+    spans:
+        [count, total seconds] of each (stage, labels), labels being a sorted tuple of (name, value).
+    counters:
+        value of each (counter, labels).
+    gauges:
+        functions returning a dict of values, exported under their name when the metrics are written.
+    """
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, labels, seconds):
+        key = (stage, tuple(sorted(labels.items())))
+        with self._lock:
+            total = self.spans.setdefault(key, [0, 0.0])
+            total[0] = total[0] + 1
+            total[1] = total[1] + seconds
+
+    def increment(self, counter, labels, value=1):
+        key = (counter, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_prometheus(self):
+        """Totals in the Prometheus text exposition format."""
+        with self._lock:
+            spans = sorted(self.spans.items())
+            counters = sorted(self.counters.items())
+        lines = ['# HELP {0}_span_seconds Self time of the timing spans, whole run for the pages.'.format(NAMESPACE),
+                 '# TYPE {0}_span_seconds summary'.format(NAMESPACE)]
+        for (stage, labels), (count, seconds) in spans:
+            labels = _format_labels((('stage', stage),) + labels)
+            lines.append('{}_span_seconds_count{} {}'.format(NAMESPACE, labels, count))
+            lines.append('{}_span_seconds_sum{} {:.6f}'.format(NAMESPACE, labels, seconds))
+        previous = None
+        for (counter, labels), value in counters:
+            # the counters are sorted, the lines of a counter follow each other
+            if counter != previous:
+                lines.append('# TYPE {}_{}_total counter'.format(NAMESPACE, counter))
+                previous = counter
+            lines.append('{}_{}_total{} {}'.format(NAMESPACE, counter, _format_labels(labels), value))
+        for name, function in sorted(self.gauges.items()):
+            for key, value in function().items():
+                metric = '{}_{}_{}'.format(NAMESPACE, name, key.replace(' ', '_'))
+                lines.append('# TYPE {} gauge'.format(metric))
+                lines.append('{} {}'.format(metric, value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        # written next to the file then moved, a scraper never reads half a file
+        temporary = path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                          for name, value in labels) + '}'
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+###
+# Instrumentation
+
+
+class _Span:
+    def __init__(self, stage, name):
+        self.stage = stage
+        self.name = name
+
+    def __enter__(self):
+        # seconds spent in the spans opened inside this one
+        self.children = 0.0
+        _get_open_spans().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        seconds = time.perf_counter() - self.start
+        spans = _get_open_spans()
+        spans.pop()
+        if spans:
+            spans[-1].children = spans[-1].children + seconds
+        # the span only counts its self time, the time of the spans inside it is counted by them
+        seconds = seconds - self.children
+        trace = getattr(_local, 'trace', None)
+        _metrics.observe(self.stage, {'name': self.name, 'page': trace['page'] if trace else ''}, seconds)
+        if trace is not None:
+            trace['spans'].append({'stage': self.stage, 'name': self.name, 'seconds': round(seconds, 6)})
+        return False
+
+
+def _get_open_spans():
+    if not hasattr(_local, 'spans'):
+        _local.spans = []
+    return _local.spans
+
+
+def span(stage, name):
+    """Context manager timing its block as a span of the stage (load, compute, render...) named name."""
+    if not ENABLED:
+        return _DISABLED
+    return _Span(stage, name)
+
+
+def count(counter, **labels):
+    """Adds one to the counter with the labels."""
+    if not ENABLED:
+        return
+    trace = getattr(_local, 'trace', None)
+    _metrics.increment(counter, dict(labels, page=trace['page'] if trace else ''))
+
+
+class _LockWait:
+    def __init__(self, lock, name):
+        self.lock = lock
+        self.name = name
+
+    def __enter__(self):
+        with _Span('lock', self.name):
+            self.lock.acquire()
+        return self
+
+    def __exit__(self, *exception):
+        self.lock.release()
+        return False
+
+
+def lock_wait(lock, name):
+    """The lock as a context manager, the time waited to acquire it is a span of the stage 'lock'."""
+    if not ENABLED:
+        return lock
+    return _LockWait(lock, name)
+
+
+class _PageRun:
+    def __init__(self, page):
+        self.page = page
+
+    def __enter__(self):
+        _local.trace = {'page': self.page, 'spans': []}
+        _local.spans = []
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        # the page span is the whole run, the spans inside it are not subtracted
+        seconds = time.perf_counter() - self.start
+        _metrics.observe('page', {'name': self.page, 'page': self.page}, seconds)
+        trace = _local.trace
+        _local.trace = None
+        logger.info(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'page': self.page,
+                                'seconds': round(seconds, 6), 'spans': trace['spans']}, ensure_ascii=False))
+        write_metrics()
+        return False
+
+
+def write_metrics():
+    """Writes the totals of the process in METRICS_FILE."""
+    if not ENABLED:
+        return
+    try:
+        _metrics.write(METRICS_FILE)
+    except OSError as error:
+        logger.warning('metrics not written to %s: %s', METRICS_FILE, error)
+
+
+def page_run(page):
+    """Context manager around the run of a page, its spans are logged and the metrics written when it ends."""
+    if not ENABLED:
+        return _DISABLED
+    return _PageRun(page)
+
+
+def add_gauges(name, function):
+    """Exports the values of the dict returned by function, named after the name and their key."""
+    _metrics.gauges[name] = function
+
+
+###
+# Endpoint
+
+
+def serve(port, path):
+    """Serves the metrics file written by the app on http://localhost:<port>/metrics."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            try:
+                with open(path, 'rb') as f:
+                    body = f.read()
+            except OSError:
+                body = b''
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    HTTPServer(('', port), Handler).serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves the metrics file written by the app.')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--file', default=METRICS_FILE or 'metrics.prom', help='metrics file written by the app')
+    args = parser.parse_args()
+    serve(args.port, args.file)
@@ -1,7 +1,11 @@
 """Frameworks for running multiple Streamlit applications as a single app.
 """
+import importlib
+
 import streamlit as st
 
+from metrics import page_run, span
+
 class MultiApp:
     """Framework for combining multiple streamlit applications.
     Usage:
@@ -20,16 +24,31 @@ class MultiApp:
         app.add_app("Foo", foo.app)
         app.add_app("Bar", bar.app)
         app.run()
+    The application can also be given by the path of its module, which is only
+    imported the first time the application is selected. The module defines
+    app() and can list the datasets it needs in DATASETS, they are loaded with
+    load_datasets before app() runs.
+        app = MultiApp(load_datasets)
+        app.add_app("Foo", "apps.foo")
+        app.add_app("Bar", "apps.bar")
+        app.run()
     """
-    def __init__(self):
+    def __init__(self, load_datasets=None):
+        """
+        Parameters
+        ----------
+        load_datasets:
+            function called with the DATASETS of an application module before the application runs.
+        """
         self.apps = []
+        self.load_datasets = load_datasets
 
     def add_app(self, title, func):
         """Adds a new application.
         Parameters
         ----------
         func:
-            the python function to render this app.
+            the python function to render this app, or the path of the module defining it.
         title:
             title of the app. Appears in the dropdown in the sidebar.
         """
@@ -44,4 +63,13 @@ class MultiApp:
             self.apps,
             format_func=lambda app: app['title'])
 
-        app['function']()
\ No newline at end of file
+        # the run of the page is timed when the app is instrumented (see metrics.py)
+        with page_run(app['title']):
+            func = app['function']
+            if isinstance(func, str):
+                module = importlib.import_module(func)
+                if self.load_datasets is not None:
+                    with span('load', 'datasets'):
+                        self.load_datasets(getattr(module, 'DATASETS', []))
+                func = module.app
+            func()
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""Cache of the datasets and aggregates, shared by the app sessions and the API requests.
+
+The loaders of data_store and the aggregates of aggregates.py and indexes.py
+are decorated with cache_resource: each value is computed once per process
+for its arguments and handed as is to every caller, the app sessions, the
+JSON API or a script, Streamlit is not involved. The values are shared, the
+callers must not modify them.
+
+A function decorated with a version function (data_store.get_data_version
+for the functions taking a legislature) keeps the version of the data its
+value was computed from. Once the ETL rewrites the data of the legislature,
+the next call computes the value again and replaces the stale one, the
+running app does not serve the old tables until it restarts.
+
+When the app is instrumented (see metrics.py) every call counts a hit or a
+miss, and the computation of a missing value is a span of the stage of the
+function. The number of values held by each function, and its hits and
+misses, are exported as gauges, they are also returned by the stats method
+of the decorated function: one value per distinct set of arguments, two
+entries for the same data (a year as an int and as a string) show up there.
+"""
+import functools
+import threading
+
+from metrics import add_gauges, count, span
+
+
+class ResourceCache:
+    """Values of one cached function.
+    Attributes
+    ----------
+    entries:
+        (version, value) of each key (the arguments of the call).
+    hits, misses:
+        number of calls answered from the cache, and computing the value.
+    """
+    def __init__(self, name, stage):
+        self.name = name
+        self.stage = stage
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # one lock per key being computed, the other callers of the key wait for the value instead of computing it too
+        self._computing = {}
+
+    def _lookup(self, key, version):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits = self.hits + 1
+                return True, entry[1]
+            return False, self._computing.setdefault(key, threading.Lock())
+
+    def get(self, key, version, compute):
+        found, value = self._lookup(key, version)
+        if not found:
+            with value:
+                # the value may have been computed by the caller this one waited for
+                found, value = self._lookup(key, version)
+                if not found:
+                    with span(self.stage, self.name):
+                        value = compute()
+                    with self._lock:
+                        self.entries[key] = (version, value)
+                        self.misses = self.misses + 1
+                        self._computing.pop(key, None)
+        count('cache_requests', name=self.name, result='hit' if found else 'miss')
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+_caches = {}
+
+
+def cache_resource(stage, version=None):
+    """Decorator caching the values of a function by arguments, the computations are spans of the stage.
+    version, when given, is called with the arguments of each call and returns the version of the data the value
+    depends on, a value of another version is computed again.
+    """
+    def decorator(function):
+        cache = ResourceCache(function.__name__, stage)
+        _caches[function.__module__ + '.' + function.__name__] = cache
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            return cache.get(key, version(*args, **kwargs) if version is not None else None,
+                             lambda: function(*args, **kwargs))
+        wrapper.clear = cache.clear
+        wrapper.stats = cache.stats
+        return wrapper
+    return decorator
+
+
+def clear_caches():
+    """Empties the caches of every function, and resets their counts."""
+    for cache in _caches.values():
+        cache.clear()
+
+
+def get_cache_stats():
+    """Entries, hits and misses of every cached function, keyed by '<function> <count>'."""
+    return {'{} {}'.format(cache.name, key): value
+            for cache in _caches.values() for key, value in cache.stats().items()}
+
+
+add_gauges('resource_cache', get_cache_stats)
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def data_root(monkeypatch):
+    """Runs the test from the root of the repository, whose data folder is read by the loaders."""
+    from resource_cache import clear_caches
+    monkeypatch.chdir(ROOT)
+    clear_caches()
+    yield ROOT
+    clear_caches()
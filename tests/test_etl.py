@@ -0,0 +1,111 @@
+"""The ETL run on a small archive of open data json files: 8 deputies, their parties and 3 scrutins over 2 years."""
+import json
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+import etl
+from data_store import load_vote_total_snapshot
+
+# 7 deputies of the party PO1, enough to keep it, and one of PO2, which is aggregated into the not declared party
+DEPUTIES = [('PA{}'.format(i), 'PO1' if i < 7 else 'PO2') for i in range(8)]
+ORGANS = [('PO1', 'PARPOL', 'Parti un', 'P1'), ('PO2', 'PARPOL', 'Parti deux', 'P2'),
+          (etl.NON_DECLARED, 'PARPOL', 'Non declare', 'ND'), ('PO0', 'ASSEMBLEE', 'Assemblee nationale', 'AN')]
+# code, date, deputies voting pour, contre
+SCRUTINS = [('VT1', '2018-03-01', ['PA0', 'PA1', 'PA2'], ['PA7']),
+            ('VT2', '2018-06-12', ['PA3'], ['PA4', 'PA5']),
+            ('VT3', '2019-01-15', ['PA0', 'PA6', 'PA7'], [])]
+
+
+def actor(code, party):
+    return {'acteur': {
+        'uid': {'#text': code},
+        'etatCivil': {'ident': {'civ': 'Mme', 'nom': 'Nom ' + code, 'prenom': 'Prenom'},
+                      'infoNaissance': {'dateNais': '1970-01-01'}},
+        'profession': {'socProcINSEE': {'famSocPro': 'Cadres et professions intellectuelles superieures'}},
+        'mandats': {'mandat': [
+            {'typeOrgane': 'PARPOL', 'organes': {'organeRef': party}, 'infosQualite': {'codeQualite': 'membre'}},
+            {'typeOrgane': 'ASSEMBLEE', 'organes': {'organeRef': 'PO0'}, 'infosQualite': {'codeQualite': 'membre'},
+             'election': {'lieu': {'departement': 'Paris', 'numDepartement': '75', 'numCirco': '1'}}}]}}}
+
+
+def organ(code, code_type, name, abreviated_name):
+    return {'organe': {'uid': code, 'codeType': code_type, 'libelle': name, 'libelleAbrev': abreviated_name}}
+
+
+def scrutin(code, date, pour, contre):
+    def votants(codes):
+        return {'votant': [{'acteurRef': code, 'parDelegation': 'false'} for code in codes]} if codes else None
+
+    return {'scrutin': {
+        'uid': code, 'dateScrutin': date, 'typeVote': {'libelleTypeVote': 'scrutin public ordinaire'},
+        'titre': "l'ensemble du projet de loi", 'demandeur': {'texte': 'Conférence des présidents'},
+        'syntheseVote': {'nombreVotants': str(len(pour) + len(contre)), 'nbrSuffragesRequis': '1',
+                         'decompte': {'pour': str(len(pour)), 'contre': str(len(contre)), 'abstentions': '0'}},
+        'ventilationVotes': {'organe': {'groupes': {'groupe': {'vote': {'decompteNominatif': {
+            'pours': votants(pour), 'contres': votants(contre), 'abstentions': None}}}}}}}}
+
+
+def write_archive(path, scrutins):
+    """Zip archive of the json files, laid out like the archives of the national assembly."""
+    with zipfile.ZipFile(path, 'w') as f:
+        for code, party in DEPUTIES:
+            f.writestr('json/acteur/{}.json'.format(code), json.dumps(actor(code, party)))
+        for record in ORGANS:
+            f.writestr('json/organe/{}.json'.format(record[0]), json.dumps(organ(*record)))
+        for record in scrutins:
+            f.writestr('json/{}.json'.format(record[0]), json.dumps(scrutin(*record)))
+    return path
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return write_archive(str(tmp_path / 'data.json.zip'), SCRUTINS)
+
+
+def test_update_writes_tables_and_snapshots(archive, tmp_path):
+    folder = str(tmp_path / '15')
+    os.makedirs(folder)
+    etl.update(folder, etl.list_zip_members(archive), 1, False, etl.Timer())
+
+    df_dep = pd.read_csv(os.path.join(folder, 'df_dep.csv'))
+    assert df_dep['code'].tolist() == [code for code, party in DEPUTIES]
+    assert df_dep['pol party'].tolist() == ['P1']*7 + ['ND']
+    df_polpar = pd.read_csv(os.path.join(folder, 'df_polpar.csv'))
+    assert dict(zip(df_polpar['abreviated_name'], df_polpar['members'])) == {'P1': 7, 'ND': 1}
+    assert len(pd.read_csv(os.path.join(folder, 'df_organs.csv')).index) == len(ORGANS)
+    assert len(pd.read_csv(os.path.join(folder, 'df_deputies_in_organs.csv')).index) == 2*len(DEPUTIES)
+
+    assert sorted(os.listdir(os.path.join(folder, 'votes'))) == ['2018', '2019']
+    for year in ['2018', '2019']:
+        partition = os.path.join(folder, 'votes', year)
+        scrutins = [record for record in SCRUTINS if record[1].startswith(year)]
+        df_vote_descr = pd.read_csv(os.path.join(partition, 'df_vote_descr.csv'))
+        assert df_vote_descr['code'].tolist() == [record[0] for record in scrutins]
+        assert df_vote_descr['pour'].tolist() == [len(record[2]) for record in scrutins]
+        # the snapshot holds the same nominative votes as the csv
+        df_csv = pd.read_csv(os.path.join(partition, 'df_vote_total.csv'))
+        df_snapshot = load_vote_total_snapshot(os.path.join(partition, 'df_vote_total.npz'))
+        assert len(df_snapshot.index) == sum(len(record[2]) + len(record[3]) for record in scrutins)
+        assert df_snapshot['scrutin'].astype(str).tolist() == df_csv['scrutin'].tolist()
+        assert df_snapshot['deputy code'].astype(str).tolist() == df_csv['deputy code'].tolist()
+        assert df_snapshot['pour'].tolist() == df_csv['pour'].astype(bool).tolist()
+        assert df_snapshot['contre'].tolist() == df_csv['contre'].astype(bool).tolist()
+
+
+def test_incremental_update_removes_deleted_scrutins(archive, tmp_path):
+    folder = str(tmp_path / '15')
+    os.makedirs(folder)
+    etl.update(folder, etl.list_zip_members(archive), 1, False, etl.Timer())
+    # the new archive drops the only scrutin of 2019 and one of 2018
+    write_archive(archive, SCRUTINS[0:1])
+    etl.update(folder, etl.list_zip_members(archive), 1, True, etl.Timer())
+
+    assert os.listdir(os.path.join(folder, 'votes')) == ['2018']
+    partition = os.path.join(folder, 'votes', '2018')
+    assert pd.read_csv(os.path.join(partition, 'df_vote_descr.csv'))['code'].tolist() == ['VT1']
+    df_snapshot = load_vote_total_snapshot(os.path.join(partition, 'df_vote_total.npz'))
+    assert df_snapshot['scrutin'].astype(str).unique().tolist() == ['VT1']
+    assert len(df_snapshot.index) == 4
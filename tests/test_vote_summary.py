@@ -0,0 +1,18 @@
+"""The vote summary page run without a Streamlit server, its widgets return their default values."""
+import logging
+
+from data_store import (get_data_vote_requesters_partition, get_data_votes_partition, get_selected_legislature,
+                        get_vote_years)
+
+
+def test_vote_partitions_cached_once_per_year(data_root):
+    from apps import vote_summary
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    vote_summary.app()
+    vote_summary.app()
+    nb_years = len(get_vote_years(get_selected_legislature()))
+    # every year is selected by default, each partition is read once whatever the type of the year
+    assert get_data_votes_partition.stats()['entries'] == nb_years
+    assert get_data_votes_partition.stats()['misses'] == nb_years
+    assert get_data_vote_requesters_partition.stats()['entries'] == nb_years